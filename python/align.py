@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+# Carries the <notes> of an annotated RFC over to a new revision of the
+# document (or to a new parse of the same document), whose section,
+# paragraph and clause ids may have shifted.
+#
+# Elements are first matched by a fingerprint of their normalized text.
+# Elements that were edited are then matched by similarity, comparing
+# each one only with the candidates that share the most word trigrams.
+
+import collections
+import copy
+import difflib
+import sys
+import xml.etree.ElementTree as etree
+
+import parseietf
+from rfc_notes import element_text
+
+
+# Trigrams occurring in more elements than this are too common to help
+# find candidates, and would make the search quadratic.
+MAX_SHINGLE_FREQUENCY = 50
+MAX_CANDIDATES = 5
+MIN_SIMILARITY = 0.6
+
+
+def element_fingerprint(elem):
+    """Return the fingerprint stored by parseietf.py, or compute it for older documents."""
+    return elem.get('fingerprint') or parseietf.fingerprint(element_text(elem))
+
+
+def shingles(words):
+    words = [word.lower() for word in words]
+    if len(words) < 3:
+        return set(words)
+    return set(zip(words, words[1:], words[2:]))
+
+
+def align(old_texts, new_texts, old_fingerprints=None, new_fingerprints=None):
+    """Match texts in old_texts with texts in new_texts.
+
+    The fingerprints of the texts are computed unless they are given.
+    Returns a dict mapping indexes in old_texts to indexes in new_texts.
+    """
+    if old_fingerprints is None:
+        old_fingerprints = [parseietf.fingerprint(text) for text in old_texts]
+    if new_fingerprints is None:
+        new_fingerprints = [parseietf.fingerprint(text) for text in new_texts]
+    matches = {}
+    new_by_hash = collections.defaultdict(collections.deque)
+    for j, hash in enumerate(new_fingerprints):
+        new_by_hash[hash].append(j)
+    for i, hash in enumerate(old_fingerprints):
+        candidates = new_by_hash.get(hash)
+        if candidates:
+            matches[i] = candidates.popleft()
+
+    matched_new = set(matches.values())
+    new_words = {}
+    index = collections.defaultdict(list)
+    for j, text in enumerate(new_texts):
+        if j not in matched_new:
+            new_words[j] = text.split()
+            for shingle in shingles(new_words[j]):
+                index[shingle].append(j)
+    for i, text in enumerate(old_texts):
+        if i in matches:
+            continue
+        words = text.split()
+        counts = collections.Counter()
+        for shingle in shingles(words):
+            postings = index.get(shingle, ())
+            if len(postings) <= MAX_SHINGLE_FREQUENCY:
+                counts.update(postings)
+        best = None
+        best_ratio = MIN_SIMILARITY
+        for j, count in counts.most_common(MAX_CANDIDATES):
+            if j in matched_new:
+                continue
+            matcher = difflib.SequenceMatcher(None, words, new_words[j], autojunk=False)
+            if matcher.quick_ratio() < best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= best_ratio:
+                best = j
+                best_ratio = ratio
+        if best is not None:
+            matches[i] = best
+            matched_new.add(best)
+    return matches
+
+
+def carry_notes(old_root, new_root):
+    """Copy <notes> from elements of old_root to the matching elements of new_root.
+
+    Returns a dict mapping old ids to new ids, and a list of the ids of
+    elements whose notes could not be carried over.
+    """
+    id_map = {}
+    pairs = []
+    orphans = []
+    for tag in ['section', 'paragraph', 'clause']:
+        old_elems = list(old_root.iter(tag))
+        new_elems = list(new_root.iter(tag))
+        matches = align([element_text(elem) for elem in old_elems],
+                [element_text(elem) for elem in new_elems],
+                [element_fingerprint(elem) for elem in old_elems],
+                [element_fingerprint(elem) for elem in new_elems])
+        for i, old_elem in enumerate(old_elems):
+            j = matches.get(i)
+            if j is None:
+                if old_elem.find('notes') is not None:
+                    orphans.append(old_elem.get('id') or old_elem.get('name'))
+                continue
+            new_elem = new_elems[j]
+            if old_elem.get('id') and new_elem.get('id'):
+                id_map[old_elem.get('id')] = new_elem.get('id')
+            pairs.append((old_elem, new_elem))
+
+    for old_elem, new_elem in pairs:
+        for notes in old_elem.findall('notes'):
+            notes = copy.deepcopy(notes)
+            for ref in notes.iter('ref'):
+                target = ref.get('target')
+                if target in id_map:
+                    ref.set('target', id_map[target])
+            new_elem.append(notes)
+    return id_map, orphans
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Carry the notes of an annotated IETF RFC over to a new revision with different clause ids')
+    parser.add_argument('old', metavar='old_notes.xml', type=str,
+            help='The path to the annotated XML document with the notes')
+    parser.add_argument('new', metavar='rfcNNNN.txt', type=str,
+            help='The path to the new document, either plain text (.txt) or XML (.xml)')
+    parser.add_argument('--out', dest='out', required=True, type=str,
+            help='The path to the XML output file')
+    parser.add_argument('--map', dest='map', type=str,
+            help='The path to an output file listing each old id and its new id')
+    args = parser.parse_args()
+
+    old = etree.parse(args.old)
+    if parseietf.is_text_path(args.new):
+        new = parseietf.parse_path(args.new).as_xml()
+    else:
+        new = etree.parse(args.new)
+    id_map, orphans = carry_notes(old.getroot(), new.getroot())
+    new.write(args.out)
+    if args.map:
+        with open(args.map, 'w') as f:
+            for old_id, new_id in id_map.items():
+                f.write('{0}\t{1}\n'.format(old_id, new_id))
+    for id in orphans:
+        sys.stderr.write('{0}: no match in the new document, notes were not carried over\n'.format(id))
+    if orphans:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
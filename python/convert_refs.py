@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+
+# Converts .req XML files of references extracted from OCaml code to the
+# compact line-delimited .reql format, which rfc_notes.py loads faster.
+
+import os
+import os.path
+
+from rfc_notes import LINES_EXT, References
+
+
+def convert(path):
+    refs = References()
+    refs.load_xml(path, None)
+    out_path = os.path.splitext(path)[0] + LINES_EXT
+    with open(out_path, 'w', encoding='utf-8') as f:
+        refs.save_lines(f)
+    return out_path
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Convert requirement references from .req XML files to the compact .reql format')
+    parser.add_argument('paths', metavar='path', nargs='+', type=str,
+            help='A .req file, or a directory to search for .req files')
+    args = parser.parse_args()
+
+    for path in args.paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                for filename in filenames:
+                    if filename.endswith('.req'):
+                        print(convert(os.path.join(dirpath, filename)))
+        else:
+            print(convert(path))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+
+# Summarizes the requirements of many IETF RFCs at once: the number of
+# MUST, SHOULD and MAY clauses per document and per section, the density
+# of RFC 2119 keywords per page, and the longest and most requirement
+# dense sections.
+#
+# Each clause becomes one row of a table stored as parallel arrays, one
+# per column, so the statistics are computed in a few passes over flat
+# arrays of integers. A table can be saved so that a corpus only has to
+# be parsed once.
+#
+# The columns are array.array rather than NumPy arrays, since the scripts
+# only depend on the standard library. The group sums and sorts that
+# NumPy would vectorize are single passes in Python instead.
+
+import array
+import collections
+import json
+import os
+import os.path
+import re
+import sys
+
+import parseietf
+
+
+IMPORTANCES = [None, 'must', 'should', 'may']
+IMPORTANCE_CODES = { importance: code for code, importance in enumerate(IMPORTANCES) }
+
+KEYWORDS = re.compile(r'\b(?:MUST|SHALL|SHOULD|RECOMMENDED|MAY|REQUIRED|OPTIONAL)\b')
+
+TABLE_HEADER = b'# reqtrace clause table 1\n'
+
+# (name, array typecode) for each column of a ClauseTable. The typecodes
+# have the same size on every platform, so saved tables are portable.
+COLUMNS = [
+        ('rfc', 'q'),
+        ('section', 'q'),
+        ('importance', 'b'),
+        ('keywords', 'q'),
+        ('length', 'q'),
+        ('page', 'q'),
+        ]
+
+
+class ClauseTable:
+    """The clauses of a corpus of RFCs, in columns.
+
+    Sections are numbered across the whole corpus, and the section
+    column holds indexes into self.sections, a list of
+    (rfc, section id, section name) tuples.
+    """
+    def __init__(self):
+        self.sections = []
+        for name, typecode in COLUMNS:
+            setattr(self, name, array.array(typecode))
+
+    def __len__(self):
+        return len(self.rfc)
+
+    def add_document(self, doc):
+        """Add the clauses of a parsed RFC.
+
+        Returns False, adding nothing, if the document has no RFC number.
+        """
+        if doc.rfc_number is None:
+            return False
+        rows = {name: [] for name, typecode in COLUMNS}
+        for section in doc.sections:
+            section_index = len(self.sections)
+            self.sections.append((doc.rfc_number, section.id, section.name))
+            for paragraph in section.paragraphs:
+                for clause in paragraph.clauses:
+                    text = clause.text
+                    importance = parseietf.get_importance(text)
+                    rows['rfc'].append(doc.rfc_number)
+                    rows['section'].append(section_index)
+                    rows['importance'].append(IMPORTANCE_CODES[importance])
+                    # Keywords are only counted where get_importance
+                    # counts them, so terminology sections are skipped.
+                    rows['keywords'].append(len(KEYWORDS.findall(text)) if importance else 0)
+                    rows['length'].append(len(text))
+                    rows['page'].append(clause.substrings[0].line.page if clause.substrings else 0)
+        for name, typecode in COLUMNS:
+            getattr(self, name).extend(rows[name])
+        return True
+
+    def add_path(self, path):
+        """Parse and add an RFC, or every rfc*.txt file below a directory.
+
+        Compressed files (rfc*.txt.gz, rfc*.txt.xz) are included too.
+        """
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if filename.startswith('rfc') and parseietf.is_text_path(filename):
+                        self.add_path(os.path.join(dirpath, filename))
+        elif not self.add_document(parseietf.parse_path(path)):
+            sys.stderr.write('{0}: no RFC number in the header, skipped\n'.format(path))
+
+    def save(self, f):
+        header = {
+                'rows': len(self),
+                'sections': self.sections,
+                'columns': [[name, typecode] for name, typecode in COLUMNS],
+                'byteorder': sys.byteorder,
+                }
+        f.write(TABLE_HEADER)
+        f.write(json.dumps(header).encode('utf-8') + b'\n')
+        for name, typecode in COLUMNS:
+            getattr(self, name).tofile(f)
+
+    @classmethod
+    def load(cls, f):
+        if f.readline() != TABLE_HEADER:
+            raise parseietf.ParseException('Not a clause table')
+        header = json.loads(f.readline().decode('utf-8'))
+        if header['columns'] != [[name, typecode] for name, typecode in COLUMNS]:
+            raise parseietf.ParseException('Unsupported clause table columns')
+        table = cls()
+        table.sections = [tuple(section) for section in header['sections']]
+        for name, typecode in COLUMNS:
+            column = getattr(table, name)
+            column.fromfile(f, header['rows'])
+            if header['byteorder'] != sys.byteorder:
+                column.byteswap()
+        return table
+
+
+def group_sum(keys, values):
+    """Return a dict mapping each key to the sum of the corresponding values."""
+    sums = collections.defaultdict(int)
+    for key, value in zip(keys, values):
+        sums[key] += value
+    return sums
+
+
+class Statistics:
+    def __init__(self, table):
+        self.table = table
+        # Clause counts by (rfc, importance) and (section, importance)
+        self.rfc_counts = collections.Counter(zip(table.rfc, table.importance))
+        self.section_counts = collections.Counter(zip(table.section, table.importance))
+        self.section_lengths = group_sum(table.section, table.length)
+        self.section_keywords = group_sum(table.section, table.keywords)
+        self.page_keywords = group_sum(zip(table.rfc, table.page), table.keywords)
+        self.page_clauses = collections.Counter(zip(table.rfc, table.page))
+
+    def importance_counts(self, counts, key):
+        return [counts[(key, code)] for code in range(1, len(IMPORTANCES))]
+
+    def by_rfc(self):
+        """Return (rfc, [musts, shoulds, mays], clauses) for each RFC."""
+        totals = collections.Counter(self.table.rfc)
+        return [(rfc, self.importance_counts(self.rfc_counts, rfc), totals[rfc])
+                for rfc in sorted(totals)]
+
+    def by_section(self):
+        """Return (rfc, section id, name, [musts, shoulds, mays]) for each section with requirements."""
+        result = []
+        for index, (rfc, id, name) in enumerate(self.table.sections):
+            counts = self.importance_counts(self.section_counts, index)
+            if any(counts):
+                result.append((rfc, id, name, counts))
+        return result
+
+    def densest_pages(self, top):
+        """Return (rfc, page, keywords, clauses) for the pages with the most keywords."""
+        pages = sorted(self.page_keywords.items(), key=lambda item: -item[1])[:top]
+        return [(rfc, page, keywords, self.page_clauses[(rfc, page)]) for (rfc, page), keywords in pages]
+
+    def longest_sections(self, top):
+        """Return (rfc, section id, name, length) for the sections with the most clause text."""
+        sections = sorted(self.section_lengths.items(), key=lambda item: -item[1])[:top]
+        return [self.table.sections[index] + (length,) for index, length in sections]
+
+    def densest_sections(self, top, min_length=500):
+        """Return (rfc, section id, name, keywords per 1000 characters) for the most requirement dense sections."""
+        densities = [(index, 1000.0 * self.section_keywords[index] / length)
+                for index, length in self.section_lengths.items() if length >= min_length]
+        densities.sort(key=lambda item: -item[1])
+        return [self.table.sections[index] + (density,) for index, density in densities[:top]]
+
+
+def section_label(rfc, id, name):
+    return 'RFC {0} {1} {2}'.format(rfc, id or '-', name)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Summarize the requirements of a corpus of IETF RFCs')
+    parser.add_argument('input', metavar='rfcNNNN.txt', nargs='*', type=str,
+            help='The paths to RFCs in plain text format (.txt, .txt.gz, .txt.xz), or directories containing them')
+    parser.add_argument('--load', dest='load', nargs='+', default=[], type=str,
+            help='The paths to clause tables saved by --save, to include without parsing again')
+    parser.add_argument('--save', dest='save', type=str,
+            help='The path to an output file for the clause table')
+    parser.add_argument('--sections', dest='sections', action='store_true',
+            help='Also list the requirement counts of every section')
+    parser.add_argument('--top', dest='top', default=10, type=int,
+            help='The number of pages and sections to list as the longest and densest')
+    args = parser.parse_args()
+
+    table = ClauseTable()
+    for path in args.load:
+        with open(path, 'rb') as f:
+            loaded = ClauseTable.load(f)
+        offset = len(table.sections)
+        table.sections.extend(loaded.sections)
+        for name, typecode in COLUMNS:
+            column = getattr(loaded, name)
+            if name == 'section':
+                column = array.array(typecode, [index + offset for index in column])
+            getattr(table, name).extend(column)
+    for path in args.input:
+        table.add_path(path)
+    if args.save:
+        with open(args.save, 'wb') as f:
+            table.save(f)
+
+    stats = Statistics(table)
+    print('RFC\tMUST\tSHOULD\tMAY\tclauses')
+    for rfc, counts, total in stats.by_rfc():
+        print('{0}\t{1}\t{2}\t{3}\t{4}'.format(rfc, *(counts + [total])))
+    if args.sections:
+        print('\nSection\tMUST\tSHOULD\tMAY')
+        for rfc, id, name, counts in stats.by_section():
+            print('{0}\t{1}\t{2}\t{3}'.format(section_label(rfc, id, name), *counts))
+    print('\nPages with the most keywords:')
+    for rfc, page, keywords, clauses in stats.densest_pages(args.top):
+        print('RFC {0} page {1}: {2} keywords in {3} clauses'.format(rfc, page, keywords, clauses))
+    print('\nLongest sections:')
+    for rfc, id, name, length in stats.longest_sections(args.top):
+        print('{0}: {1} characters'.format(section_label(rfc, id, name), length))
+    print('\nMost requirement dense sections:')
+    for rfc, id, name, density in stats.densest_sections(args.top):
+        print('{0}: {1:.1f} keywords per 1000 characters'.format(section_label(rfc, id, name), density))
+
+if __name__ == '__main__':
+    main()
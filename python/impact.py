@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+# Lists the requirements affected by a change to the source code, so that
+# reviewers can check the changed code against the affected clauses.
+#
+# The changed line ranges of each file are read from a unified diff, or
+# given as file:first-last, and looked up in a refindex.LocationIndex of
+# the references from .req files and from the <coderef> elements of
+# annotated RFCs.
+
+import re
+import sys
+import xml.etree.ElementTree as etree
+
+import refindex
+from rfc_notes import IMPORTANCES, IMPORTANCE_HEADINGS, References, docid_as_text
+
+
+HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+
+def strip_path(path, strip):
+    path = path.split('\t', 1)[0].strip()
+    if path == '/dev/null':
+        return None
+    return '/'.join(path.split('/')[strip:])
+
+
+def diff_ranges(lines, strip=1):
+    """Return a dict mapping each file in a unified diff to the ranges of changed lines.
+
+    Line numbers are those of the old version of the file, since the
+    references were extracted from it. Where lines were only inserted,
+    the range covers the lines on either side of the insertion.
+    """
+    ranges = {}
+    path = None
+    old_line = None
+    old_remaining = new_remaining = 0
+    for line in lines:
+        line = line.rstrip('\n')
+        if old_remaining <= 0 and new_remaining <= 0:
+            if line.startswith('--- '):
+                path = strip_path(line[4:], strip)
+                continue
+            if line.startswith('+++ '):
+                continue
+            match = HUNK_HEADER.match(line)
+            if match:
+                old_line = int(match.group(1))
+                old_remaining = int(match.group(2) or '1')
+                new_remaining = int(match.group(4) or '1')
+                if old_remaining == 0:
+                    # Lines inserted at the start of the file, or after old_line
+                    old_line += 1
+            continue
+        if path is None:
+            old_remaining = new_remaining = 0
+            continue
+        if line.startswith('-'):
+            ranges.setdefault(path, []).append((old_line, old_line))
+            old_line += 1
+            old_remaining -= 1
+        elif line.startswith('+'):
+            ranges.setdefault(path, []).append((max(1, old_line - 1), old_line))
+            new_remaining -= 1
+        elif line.startswith('\\'):
+            # "\ No newline at end of file"
+            pass
+        else:
+            old_line += 1
+            old_remaining -= 1
+            new_remaining -= 1
+    return ranges
+
+
+def merge_ranges(ranges, context=0):
+    """Sort ranges, widen them by context lines and merge those that overlap."""
+    merged = []
+    for first, last in sorted(ranges):
+        first = max(1, first - context)
+        last = last + context
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], last)
+        else:
+            merged.append([first, last])
+    return merged
+
+
+def affected(index, ranges, context=0):
+    """Return a dict mapping (docid, reqid) to the Locations within ranges that refer to it."""
+    result = {}
+    for path, file_ranges in ranges.items():
+        for first, last in merge_ranges(file_ranges, context):
+            for loc in index.lookup(path, first, last):
+                result.setdefault((loc.docid, loc.reqid), []).append(loc)
+    return result
+
+
+def by_importance(result):
+    """Group the affected requirements by importance, most important first."""
+    groups = []
+    for importance in IMPORTANCES + [None]:
+        keys = sorted(key for key, locs in result.items() if locs[0].importance == importance)
+        if keys:
+            groups.append((importance, [(key, result[key]) for key in keys]))
+    return groups
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='List the requirements referred to from code changed by a diff')
+    parser.add_argument('diff', metavar='changes.diff', nargs='?', type=str,
+            help='The path to a unified diff, or - for standard input')
+    parser.add_argument('--lines', dest='lines', nargs='+', default=[], type=str,
+            help='Changed lines, as file:line or file:first-last, in addition to or instead of a diff')
+    parser.add_argument('-p', dest='strip', default=1, type=int,
+            help='The number of leading directories to strip from the paths in the diff, as for patch')
+    parser.add_argument('--context', dest='context', default=0, type=int,
+            help='Also count references within this many lines of a change')
+    parser.add_argument('--ref', dest='ref', nargs='+', default=[], type=str,
+            help='The path to one or more input XML files containing requirement references extracted from OCaml code, directories or tar archives of them')
+    parser.add_argument('--notes', dest='notes', nargs='+', default=[], type=str,
+            help='The paths to annotated XML documents, for the text and importance of clauses and their <coderef> elements')
+    parser.add_argument('--index', dest='index', type=str,
+            help='The path to an index saved by refindex.py, instead of --ref and --notes')
+    args = parser.parse_args()
+
+    ranges = {}
+    if args.diff == '-':
+        ranges = diff_ranges(sys.stdin, args.strip)
+    elif args.diff:
+        with open(args.diff, 'r', encoding='utf-8', errors='replace') as f:
+            ranges = diff_ranges(f, args.strip)
+    for text in args.lines:
+        try:
+            path, first, last = refindex.parse_location(text)
+        except ValueError as e:
+            parser.error(str(e))
+        ranges.setdefault(path, []).append((first, last))
+
+    if args.index:
+        index = refindex.load_index(args.index)
+    else:
+        refs = References()
+        refs.load_paths(args.ref, None)
+        index = refindex.LocationIndex.from_references(refs, [etree.parse(path).getroot() for path in args.notes])
+
+    try:
+        result = affected(index, ranges, args.context)
+    except ValueError as e:
+        parser.error(str(e))
+    for importance, requirements in by_importance(result):
+        print(IMPORTANCE_HEADINGS.get(importance, 'Other'))
+        for (docid, reqid), locs in requirements:
+            print('  {0} {1}: {2}'.format(docid_as_text(docid), reqid, locs[0].text or ''))
+            for loc in locs:
+                print('    {0}:{1}: {2}'.format(loc.filename, loc.line, loc.type))
+
+if __name__ == '__main__':
+    main()
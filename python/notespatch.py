@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+
+# Edits the <notes> of an annotated RFC by splicing bytes, without
+# parsing and rewriting the whole document, so everything outside the
+# edited notes is kept byte for byte.
+#
+# The document is scanned once to find the offsets of every section,
+# paragraph and clause with an id, and of its <notes> child. The offsets
+# are kept in document order in a Fenwick tree of adjustments, so after
+# an edit the offsets that follow it are moved in O(log n) time.
+#
+# The bytes themselves are a single buffer, so each edit still moves
+# everything after it, in O(document) time, and save() rewrites the file
+# from the first edit to the end. That is fine for the command line,
+# which makes a few edits per run; applying many edits in one batch
+# would need a piece table instead.
+
+import re
+import xml.etree.ElementTree as etree
+
+from rfc_notes import ParseException
+
+
+INDEXED_TAGS = (b'section', b'paragraph', b'clause')
+
+TOKEN = re.compile(rb'<!--.*?-->|<\?.*?\?>|<!\[CDATA\[.*?\]\]>|<!DOCTYPE[^>]*>'
+        rb'|<(/?)([A-Za-z_][\w.:-]*)((?:[^>"\']|"[^"]*"|\'[^\']*\')*?)(/?)>', re.S)
+ID_ATTR = re.compile(rb'''\sid\s*=\s*(?:"([^"]*)"|'([^']*)')''')
+
+# The points recorded for each indexed element. Where the element has no
+# <notes>, the three notes points are all at the start of its end tag,
+# which is where new notes are inserted.
+START, NOTES_START, NOTES_CONTENT_END, NOTES_END, CONTENT_END, END = range(6)
+
+
+class Offsets:
+    """A sorted list of offsets, supporting "add delta to every offset from index i onwards" in O(log n)."""
+    def __init__(self, offsets):
+        self.base = offsets
+        self.tree = [0] * (len(offsets) + 1)
+
+    def add(self, i, delta):
+        i += 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def __getitem__(self, i):
+        value = self.base[i]
+        i += 1
+        while i > 0:
+            value += self.tree[i]
+            i -= i & -i
+        return value
+
+    def set(self, i, value):
+        delta = value - self[i]
+        if delta:
+            self.add(i, delta)
+            self.add(i + 1, -delta)
+
+
+def notes_bytes(notes):
+    """Serialize a <notes> element, without its tail."""
+    tail = notes.tail
+    notes.tail = None
+    try:
+        return etree.tostring(notes)
+    finally:
+        notes.tail = tail
+
+
+class NotesFile:
+    def __init__(self, data):
+        self.data = bytearray(data)
+        # id -> (tag, the index in self.offsets of each of its points)
+        self.elements = {}
+        # The ids of elements with a <notes/> child
+        self.empty_notes = set()
+        self.dirty_from = None
+        self.scan()
+
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as f:
+            return cls(f.read())
+
+    def scan(self):
+        points = []
+        # [tag, id, notes, point indexes] for each open element, where id
+        # is only set for indexed elements and notes is None, 'open' or 'closed'
+        stack = []
+        for match in TOKEN.finditer(self.data):
+            closing, tag, attrs, empty = match.groups()
+            if tag is None:
+                continue
+            parent = stack[-1] if stack else None
+            if closing:
+                if parent is None or parent[0] != tag:
+                    raise ParseException('Unexpected </{0}> at offset {1}'.format(tag.decode(), match.start()))
+                stack.pop()
+                if parent[1] is not None:
+                    ranks = parent[3]
+                    if parent[2] is None:
+                        ranks.extend(range(len(points), len(points) + 3))
+                        points.extend([match.start()] * 3)
+                    ranks.extend([len(points), len(points) + 1])
+                    points.extend([match.start(), match.end()])
+                elif tag == b'notes' and stack and stack[-1][2] == 'open':
+                    stack[-1][3].extend([len(points), len(points) + 1])
+                    points.extend([match.start(), match.end()])
+                    stack[-1][2] = 'closed'
+                continue
+            if tag == b'notes' and parent and parent[1] is not None and parent[2] is None:
+                parent[3].append(len(points))
+                points.append(match.start())
+                if empty:
+                    parent[3].extend([len(points), len(points) + 1])
+                    points.extend([match.end(), match.end()])
+                    parent[2] = 'closed'
+                    self.empty_notes.add(parent[1])
+                else:
+                    parent[2] = 'open'
+                    stack.append([tag, None, None, None])
+                continue
+            id = None
+            if tag in INDEXED_TAGS:
+                id_match = ID_ATTR.search(attrs)
+                if id_match:
+                    id = (id_match.group(1) or id_match.group(2) or b'').decode('utf-8') or None
+            ranks = None
+            if id is not None:
+                if empty:
+                    raise ParseException('<{0} id="{1}"/> has no content'.format(tag.decode(), id))
+                ranks = [len(points)]
+                points.append(match.start())
+                self.elements[id] = (tag.decode(), ranks)
+            if not empty:
+                stack.append([tag, id, None, ranks])
+        if stack:
+            raise ParseException('Unclosed <{0}>'.format(stack[-1][0].decode()))
+        self.offsets = Offsets(points)
+
+    def offset(self, id, point):
+        return self.offsets[self.elements[id][1][point]]
+
+    def span(self, id):
+        """Return the (start, end) offsets of the element with this id."""
+        return self.offset(id, START), self.offset(id, END)
+
+    def has_notes(self, id):
+        return self.offset(id, NOTES_START) != self.offset(id, NOTES_END)
+
+    def get_notes(self, id):
+        """Return the parsed <notes> of the element with this id, or None."""
+        start, end = self.offset(id, NOTES_START), self.offset(id, NOTES_END)
+        if start == end:
+            return None
+        return etree.fromstring(bytes(self.data[start:end]))
+
+    def splice(self, start, end, new):
+        self.data[start:end] = new
+        if self.dirty_from is None or start < self.dirty_from:
+            self.dirty_from = start
+
+    def replace_notes(self, id, notes):
+        """Replace the <notes> of the element with this id, adding them if it has none."""
+        ranks = self.elements[id][1]
+        new = notes_bytes(notes)
+        start = self.offsets[ranks[NOTES_START]]
+        end = self.offsets[ranks[NOTES_END]]
+        content_end = len(new) - len(b'</notes>')
+        if not new.endswith(b'</notes>'):
+            # A <notes /> element
+            content_end = len(new)
+        notes_end = len(new)
+        if start == end:
+            # New notes go at the end of the element, each on its own line
+            new += b'\n'
+        self.splice(start, end, new)
+        self.offsets.add(ranks[NOTES_END] + 1, len(new) - (end - start))
+        self.offsets.set(ranks[NOTES_CONTENT_END], start + content_end)
+        self.offsets.set(ranks[NOTES_END], start + notes_end)
+        if content_end == notes_end:
+            self.empty_notes.add(id)
+        else:
+            self.empty_notes.discard(id)
+
+    def add_to_notes(self, id, child):
+        """Append a <note>, <coderef> or <ref> to the <notes> of the element with this id."""
+        if not self.has_notes(id) or id in self.empty_notes:
+            notes = etree.Element('notes')
+            notes.text = '\n'
+            if id in self.empty_notes:
+                notes.attrib.update(self.get_notes(id).attrib)
+            child.tail = '\n'
+            notes.append(child)
+            self.replace_notes(id, notes)
+            return
+        child.tail = '\n'
+        new = etree.tostring(child)
+        rank = self.elements[id][1][NOTES_CONTENT_END]
+        position = self.offsets[rank]
+        self.splice(position, position, new)
+        self.offsets.add(rank, len(new))
+
+    def write(self, f):
+        f.write(self.data)
+
+    def save(self, path):
+        """Write the changes back to path, rewriting only the part of the file after the first edit."""
+        if self.dirty_from is None:
+            return
+        with open(path, 'r+b') as f:
+            f.seek(self.dirty_from)
+            f.write(memoryview(self.data)[self.dirty_from:])
+            f.truncate()
+        self.dirty_from = None
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Add notes to an annotated IETF RFC, changing nothing else in the file')
+    parser.add_argument('input', metavar='rfcNNNN_notes.xml', nargs=1, type=str,
+            help='The path to the annotated XML document (.xml), which is updated in place')
+    parser.add_argument('--id', dest='id', required=True, type=str,
+            help='The id of the section, paragraph or clause to annotate')
+    parser.add_argument('--note', dest='note', type=str,
+            help='The text of a note to add')
+    parser.add_argument('--note-type', dest='note_type', type=str,
+            help='The type of the note, e.g. todo')
+    parser.add_argument('--coderef', dest='coderef', type=str,
+            help='A code reference to add, as path:line')
+    parser.add_argument('--coderef-type', dest='coderef_type', default='impl', choices=['impl', 'test'],
+            help='The type of the code reference')
+    parser.add_argument('--replace', dest='replace', type=str,
+            help='The path to an XML file containing a <notes> element to replace the existing notes')
+    args = parser.parse_args()
+
+    doc = NotesFile.open(args.input[0])
+    if args.id not in doc.elements:
+        parser.error('No element with id {0} in {1}'.format(args.id, args.input[0]))
+    if args.replace:
+        doc.replace_notes(args.id, etree.parse(args.replace).getroot())
+    if args.note:
+        note = etree.Element('note')
+        note.text = args.note
+        if args.note_type:
+            note.set('type', args.note_type)
+        doc.add_to_notes(args.id, note)
+    if args.coderef:
+        path, sep, line = args.coderef.rpartition(':')
+        if not sep:
+            parser.error('--coderef should be path:line')
+        doc.add_to_notes(args.id, etree.Element('coderef', type=args.coderef_type, path=path, line=line))
+    doc.save(args.input[0])
+
+if __name__ == '__main__':
+    main()
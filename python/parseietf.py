@@ -4,9 +4,14 @@
 # - http://www.ietf.org/proceedings/62/slides/editor-0.pdf
 # - https://tools.ietf.org/html/rfc2026
 
+import datetime
+import gzip
 import hashlib
+import json
+import lzma
 import re
 import xml.etree.ElementTree as etree
+from xml.sax.saxutils import XMLGenerator
 
 
 STYLES = '''
@@ -83,7 +88,7 @@ class LineSubstring:
 
     @property
     def end(self):
-        return self.line.end + self.relative_end
+        return self.line.start + self.relative_end
 
     @property
     def text(self):
@@ -110,6 +115,35 @@ def get_importance(text):
             return 'may'
 
 
+def fingerprint(text):
+    """Return a hash of text that ignores differences in whitespace."""
+    normalized = ' '.join(text.split())
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16]
+
+
+class Values:
+    """The id, text and importance of a section, paragraph or clause.
+
+    Emitter computes these once for each element and passes them to
+    every sink, instead of each output format deriving them again.
+    """
+    def __init__(self, obj):
+        self.id = obj.id
+        if isinstance(obj, Section):
+            self.text = None
+            self.importance = None
+        else:
+            self.text = obj.text
+            self.importance = get_importance(self.text)
+        self._fingerprint = None
+
+    @property
+    def fingerprint(self):
+        if self._fingerprint is None:
+            self._fingerprint = fingerprint(self.text)
+        return self._fingerprint
+
+
 class Clause:
     def __init__(self, paragraph, num):
         self.paragraph = paragraph
@@ -128,32 +162,39 @@ class Clause:
     def importance(self):
         return get_importance(self.text)
 
-    def as_xml(self):
+    @property
+    def fingerprint(self):
+        return fingerprint(self.text)
+
+    def as_xml(self, values=None):
+        if values is None:
+            values = Values(self)
         elem = etree.Element('clause')
-        elem.set('id', self.id)
+        elem.set('id', values.id)
         elem.set('num', str(self.num))
-        importance = self.importance
-        if importance:
-            elem.set('importance', importance)
+        if values.importance:
+            elem.set('importance', values.importance)
+        elem.set('fingerprint', values.fingerprint)
         elem.text = '\n'
         for sub in self.substrings:
             elem.append(sub.as_xml())
         elem.tail = '\n'
         return elem
 
-    def as_html(self):
+    def as_html(self, values=None):
+        if values is None:
+            values = Values(self)
         elem = etree.Element('span')
-        elem.set('id', self.id)
+        elem.set('id', values.id)
         css_class = 'clause'
-        importance = self.importance
-        if importance:
-            css_class += ' ' + importance
+        if values.importance:
+            css_class += ' ' + values.importance
         elem.set('class', css_class)
         label = etree.Element('span')
         label.set('class', 'label')
-        label.text = self.id
+        label.text = values.id
         elem.append(label)
-        label.tail = self.text
+        label.tail = values.text
         elem.tail = '\n'
         return elem
 
@@ -163,7 +204,7 @@ class Paragraph:
         self.section = section
         self.num = num
         self.lines = []
-        self.clauses = []
+        self._clauses = None
 
     @property
     def text(self):
@@ -185,8 +226,19 @@ class Paragraph:
     def importance(self):
         return get_importance(self.text)
 
+    @property
+    def fingerprint(self):
+        return fingerprint(self.text)
+
+    @property
+    def clauses(self):
+        # Clauses are only split out of the text when first needed
+        if self._clauses is None:
+            self.parse()
+        return self._clauses
+
     def parse(self):
-        self.clauses = []
+        self._clauses = []
         # Split numbered sections into numbered clauses (sentences)
         if self.lines and self.section.num:
             text = ' '.join(line.text for line in self.lines)
@@ -244,41 +296,54 @@ class Paragraph:
                         clause.substrings.append(LineSubstring(line, sub_start - para_i, sub_end - para_i))
                     para_i += line.len + 1
                 assert len(clause.text.strip()) > 4, repr((clause.text, clause.id))
-                self.clauses.append(clause)
+                self._clauses.append(clause)
                 start = end
                 num += 1
 
-    def as_xml(self):
-        if not self.clauses:
-            self.parse()
+    def as_xml(self, values=None):
+        elem = self.start_xml(values or Values(self))
+        for clause in self.clauses:
+            elem.append(clause.as_xml())
+        self.end_xml(elem)
+        return elem
+
+    def start_xml(self, values):
+        """Return the <paragraph> element, to which the <clause> elements are then added."""
         elem = etree.Element('paragraph')
         elem.set('num', str(self.num))
-        if self.id:
-            elem.set('id', self.id)
-        importance = self.importance
-        if importance:
-            elem.set('importance', importance)
+        if values.id:
+            elem.set('id', values.id)
+        if values.importance:
+            elem.set('importance', values.importance)
+        elem.set('fingerprint', values.fingerprint)
         elem.text = '\n'
-        if self.clauses:
-            for clause in self.clauses:
-                elem.append(clause.as_xml())
-        else:
+        return elem
+
+    def end_xml(self, elem):
+        if not self.clauses:
             for line in self.lines:
                 elem.append(line.as_xml())
         elem.tail = '\n\n'
+
+    def as_html(self, values=None):
+        elem = self.start_html(values or Values(self))
+        for clause in self.clauses:
+            elem.append(clause.as_html())
+        self.end_html(elem)
         return elem
 
-    def as_html(self):
-        if not self.clauses:
-            self.parse()
+    def start_html(self, values):
         elem = etree.Element('p')
         elem.set('class', 'paragraph')
         elem.text = '\n'
-        if self.id:
-            elem.set('id', self.id)
+        if values.id:
+            elem.set('id', values.id)
+        return elem
+
+    def end_html(self, elem):
         if self.clauses:
-            for clause in self.clauses:
-                elem.append(clause.as_html())
+            # Already added by the caller
+            pass
         elif self.section.name == 'Table of Contents':
             pre = etree.Element('pre')
             pre.text = '\n'.join(line.text for line in self.lines)
@@ -287,15 +352,16 @@ class Paragraph:
             for line in self.lines:
                 elem.append(line.as_html())
         elem.tail = '\n\n'
-        return elem
 
 
 class Section:
-    def __init__(self, doc, heading):
+    def __init__(self, doc, heading, start=0, end=0):
         self.doc = doc
         self.heading = heading
-        self.lines = []
-        self.paragraphs = []
+        # The range of doc.lines following the heading
+        self.start = start
+        self.end = end
+        self._paragraphs = None
         sep = '. '
         i = heading.find(sep)
         if i == -1:
@@ -314,25 +380,60 @@ class Section:
         else:
             return ''
 
+    @property
+    def lines(self):
+        return self.doc.lines[self.start : self.end]
+
+    @property
+    def paragraphs(self):
+        # Paragraphs are only split out of the lines when first needed
+        if self._paragraphs is None:
+            self.parse()
+        return self._paragraphs
+
+    def parse(self):
+        self._paragraphs = []
+        paragraph = None
+        for line in self.lines:
+            if line.is_blank:
+                # Blank lines alone aren't always the end of a paragraph
+                # because a paragraph may be split across two pages.
+                if paragraph and paragraph.has_ended:
+                    paragraph = None
+            elif line.text.startswith(' '):
+                if paragraph is None:
+                    paragraph = Paragraph(self, len(self._paragraphs) + 1)
+                    self._paragraphs.append(paragraph)
+                paragraph.lines.append(line)
+            # Anything else is a page header, page footer or form feed
+
     def as_xml(self):
+        elem = self.start_xml()
+        for paragraph in self.paragraphs:
+            elem.append(paragraph.as_xml())
+        return elem
+
+    def start_xml(self):
+        """Return the <section> element, to which the <paragraph> elements are then added."""
         elem = etree.Element('section')
         elem.text = '\n'
         if self.num:
             elem.set('num', self.num)
             elem.set('id', self.id)
         elem.set('name', self.name)
-        for paragraph in self.paragraphs:
-            elem.append(paragraph.as_xml())
         elem.tail = '\n\n'
         return elem
 
     def as_html(self):
+        return [self.heading_html()] + [paragraph.as_html() for paragraph in self.paragraphs]
+
+    def heading_html(self):
         h = etree.Element('h2')
         if self.num:
             h.set('id', self.id)
         h.text = self.heading
         h.tail = '\n\n'
-        return [h] + [paragraph.as_html() for paragraph in self.paragraphs]
+        return h
 
 
 class Document:
@@ -346,6 +447,13 @@ class Document:
         self.sections = []
 
     def as_xml(self):
+        root, sections_elem = self.start_xml()
+        for section in self.sections:
+            sections_elem.append(section.as_xml())
+        return etree.ElementTree(root)
+
+    def start_xml(self):
+        """Return the <rfc> element and its <sections> element, which is empty."""
         root = etree.Element('rfc',
                 number=str(self.rfc_number),
                 title=self.title,
@@ -366,14 +474,18 @@ class Document:
 
         sections_elem = etree.Element('sections')
         sections_elem.text = '\n\n'
-        for section in self.sections:
-            sections_elem.append(section.as_xml())
         sections_elem.tail = '\n'
         root.append(sections_elem)
-
-        return etree.ElementTree(root)
+        return root, sections_elem
 
     def as_html(self):
+        root, body = self.start_html()
+        for section in self.sections:
+            body.extend(section.as_html())
+        return b'<!DOCTYPE html>\n' + etree.tostring(root)
+
+    def start_html(self):
+        """Return the <html> element and its <body>, which only has a heading."""
         root = etree.Element('html',
                 xmlns='http://www.w3.org/1999/xhtml')
 
@@ -397,45 +509,479 @@ class Document:
         h = etree.Element('h1')
         h.text = title
         body.append(h)
-
-        for section in self.sections:
-            body.extend(section.as_html())
         body.tail = '\n'
         root.append(body)
+        return root, body
+
+    def as_reqif(self, f, refs=None, last_change=None):
+        """Write the document to the binary file f in ReqIF format.
+
+        Each section, paragraph and clause becomes a SPEC-OBJECT, arranged
+        in a SPECIFICATION following the structure of the document.
+        If refs (an rfc_notes.References) is given, each code reference
+        becomes a SPEC-OBJECT with a SPEC-RELATION to its requirement.
+        The output is streamed, so no tree is built in memory.
+        """
+        writer = ReqifWriter(f, 'rfc{0}'.format(self.rfc_number), last_change)
+        writer.write(self, refs)
+
+    def elements(self):
+        """Yield (depth, object) for each section, paragraph and clause in order."""
+        for section in self.sections:
+            yield 0, section
+            for paragraph in section.paragraphs:
+                yield 1, paragraph
+                for clause in paragraph.clauses:
+                    yield 2, clause
+
+
+REQIF_NS = 'http://www.omg.org/spec/ReqIF/20110401/reqif.xsd'
+REQIF_IMPORTANCES = ['must', 'should', 'may']
+REQIF_ATTRIBUTES = [
+        # (identifier, long name, datatype)
+        ('ad-reqid', 'ReqIF.ForeignID', 'string'),
+        ('ad-name', 'ReqIF.ChapterName', 'string'),
+        ('ad-text', 'ReqIF.Text', 'string'),
+        ('ad-importance', 'Importance', 'importance'),
+        ('ad-path', 'Path', 'string'),
+        ('ad-line', 'Line', 'integer'),
+        ('ad-reftype', 'Reference Type', 'string'),
+        ]
+REQIF_SPEC_OBJECT_TYPES = [
+        # (identifier, long name, attribute identifiers)
+        ('st-section', 'Section', ['ad-reqid', 'ad-name']),
+        ('st-paragraph', 'Paragraph', ['ad-reqid', 'ad-text', 'ad-importance']),
+        ('st-clause', 'Clause', ['ad-reqid', 'ad-text', 'ad-importance']),
+        ('st-coderef', 'Code Reference', ['ad-path', 'ad-line', 'ad-reftype']),
+        ]
+
+
+class ReqifWriter:
+    def __init__(self, f, prefix, last_change=None):
+        self.out = XMLGenerator(f, 'utf-8', short_empty_elements=True)
+        self.prefix = prefix
+        if last_change is None:
+            last_change = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        self.last_change = last_change
+        self.datatypes = {name: 'dt-' + name for name in ['string', 'integer', 'importance']}
+        self.attribute_kinds = {id: 'ENUMERATION' if datatype == 'importance' else datatype.upper()
+                for id, long_name, datatype in REQIF_ATTRIBUTES}
+
+    def start(self, tag, attrs={}):
+        self.out.startElement(tag, attrs)
+
+    def end(self, tag):
+        self.out.endElement(tag)
+        self.out.ignorableWhitespace('\n')
+
+    def element(self, tag, attrs={}, text=None):
+        self.out.startElement(tag, attrs)
+        if text is not None:
+            self.out.characters(text)
+        self.end(tag)
+
+    def identifiable(self, identifier, long_name=None):
+        attrs = {'IDENTIFIER': identifier, 'LAST-CHANGE': self.last_change}
+        if long_name:
+            attrs['LONG-NAME'] = long_name
+        return attrs
+
+    def ref(self, outer, ref_tag, identifier):
+        self.start(outer)
+        self.element(ref_tag, text=identifier)
+        self.end(outer)
+
+    def object_id(self, id, index):
+        if id:
+            return '{0}-{1}'.format(self.prefix, id)
+        return '{0}-{1}'.format(self.prefix, index)
+
+    def write(self, doc, refs):
+        self.start_document(doc, refs)
+        for depth, obj in doc.elements():
+            self.add(depth, obj, Values(obj))
+        self.end_document()
+
+    def start_document(self, doc, refs):
+        self.refs = refs
+        self.spec_name = 'RFC {0}: {1}'.format(doc.rfc_number, doc.title)
+        # reqid -> object identifier, for the code references
+        self.ids = {}
+        # (depth, identifier) of each object, for the SPECIFICATION
+        self.hierarchy = []
+        self.out.startDocument()
+        self.start('REQ-IF', {'xmlns': REQIF_NS})
+        self.out.ignorableWhitespace('\n')
+        self.start('THE-HEADER')
+        self.start('REQ-IF-HEADER', {'IDENTIFIER': self.prefix + '-header'})
+        self.element('CREATION-TIME', text=self.last_change)
+        self.element('REQ-IF-TOOL-ID', text='parseietf')
+        self.element('REQ-IF-VERSION', text='1.0')
+        self.element('SOURCE-TOOL-ID', text='parseietf')
+        self.element('TITLE', text=self.spec_name)
+        self.end('REQ-IF-HEADER')
+        self.end('THE-HEADER')
+        self.start('CORE-CONTENT')
+        self.start('REQ-IF-CONTENT')
+        self.out.ignorableWhitespace('\n')
+        self.write_types()
+
+        # Objects are identified by position, so that sections and paragraphs
+        # without an id still get a unique identifier.
+        self.start('SPEC-OBJECTS')
+        self.out.ignorableWhitespace('\n')
+
+    def add(self, depth, obj, values):
+        """Write the SPEC-OBJECT for a section (depth 0), paragraph (1) or clause (2)."""
+        identifier = self.object_id(values.id, len(self.hierarchy))
+        if values.id:
+            self.ids[values.id] = identifier
+        self.write_object(identifier, obj, values)
+        self.hierarchy.append((depth, identifier))
+
+    def end_document(self):
+        coderefs = []
+        if self.refs:
+            for reqid, references in sorted(self.refs.references.items()):
+                if reqid not in self.ids:
+                    continue
+                for ref in references:
+                    identifier = '{0}-code{1}'.format(self.prefix, len(coderefs) + 1)
+                    coderefs.append((identifier, self.ids[reqid]))
+                    self.write_coderef(identifier, ref)
+        self.end('SPEC-OBJECTS')
+
+        self.start('SPEC-RELATIONS')
+        self.out.ignorableWhitespace('\n')
+        for i, (source, target) in enumerate(coderefs):
+            self.start('SPEC-RELATION', self.identifiable('{0}-rel{1}'.format(self.prefix, i + 1)))
+            self.ref('TYPE', 'SPEC-RELATION-TYPE-REF', 'srt-implements')
+            self.ref('SOURCE', 'SPEC-OBJECT-REF', source)
+            self.ref('TARGET', 'SPEC-OBJECT-REF', target)
+            self.end('SPEC-RELATION')
+        self.end('SPEC-RELATIONS')
+
+        self.start('SPECIFICATIONS')
+        self.start('SPECIFICATION', self.identifiable(self.prefix, self.spec_name))
+        self.ref('TYPE', 'SPECIFICATION-TYPE-REF', 'spt-rfc')
+        self.start('CHILDREN')
+        self.out.ignorableWhitespace('\n')
+        # Each entry is [depth, whether a <CHILDREN> element has been opened]
+        stack = []
+        for depth, identifier in self.hierarchy:
+            while stack and stack[-1][0] >= depth:
+                self.close_hierarchy(stack.pop())
+            if stack and not stack[-1][1]:
+                self.start('CHILDREN')
+                self.out.ignorableWhitespace('\n')
+                stack[-1][1] = True
+            self.start('SPEC-HIERARCHY', self.identifiable('h-' + identifier))
+            self.ref('OBJECT', 'SPEC-OBJECT-REF', identifier)
+            stack.append([depth, False])
+        while stack:
+            self.close_hierarchy(stack.pop())
+        self.end('CHILDREN')
+        self.end('SPECIFICATION')
+        self.end('SPECIFICATIONS')
+
+        self.end('REQ-IF-CONTENT')
+        self.end('CORE-CONTENT')
+        self.end('REQ-IF')
+        self.out.endDocument()
+
+    def close_hierarchy(self, entry):
+        if entry[1]:
+            self.end('CHILDREN')
+        self.end('SPEC-HIERARCHY')
+
+    def write_types(self):
+        self.start('DATATYPES')
+        self.out.ignorableWhitespace('\n')
+        string_attrs = self.identifiable(self.datatypes['string'], 'String')
+        string_attrs['MAX-LENGTH'] = '65535'
+        self.element('DATATYPE-DEFINITION-STRING', string_attrs)
+        integer_attrs = self.identifiable(self.datatypes['integer'], 'Integer')
+        integer_attrs['MIN'] = '0'
+        integer_attrs['MAX'] = '2147483647'
+        self.element('DATATYPE-DEFINITION-INTEGER', integer_attrs)
+        self.start('DATATYPE-DEFINITION-ENUMERATION', self.identifiable(self.datatypes['importance'], 'Importance'))
+        self.start('SPECIFIED-VALUES')
+        for i, importance in enumerate(REQIF_IMPORTANCES):
+            self.start('ENUM-VALUE', self.identifiable('ev-' + importance, importance.upper()))
+            self.start('PROPERTIES')
+            self.element('EMBEDDED-VALUE', {'KEY': str(i), 'OTHER-CONTENT': importance})
+            self.end('PROPERTIES')
+            self.end('ENUM-VALUE')
+        self.end('SPECIFIED-VALUES')
+        self.end('DATATYPE-DEFINITION-ENUMERATION')
+        self.end('DATATYPES')
+
+        self.start('SPEC-TYPES')
+        self.out.ignorableWhitespace('\n')
+        datatypes = {id: datatype for id, long_name, datatype in REQIF_ATTRIBUTES}
+        long_names = {id: long_name for id, long_name, datatype in REQIF_ATTRIBUTES}
+        for type_id, type_name, attribute_ids in REQIF_SPEC_OBJECT_TYPES:
+            self.start('SPEC-OBJECT-TYPE', self.identifiable(type_id, type_name))
+            self.start('SPEC-ATTRIBUTES')
+            for id in attribute_ids:
+                kind = self.attribute_kinds[id]
+                attrs = self.identifiable(type_id + '-' + id, long_names[id])
+                if kind == 'ENUMERATION':
+                    attrs['MULTI-VALUED'] = 'false'
+                self.start('ATTRIBUTE-DEFINITION-' + kind, attrs)
+                self.ref('TYPE', 'DATATYPE-DEFINITION-{0}-REF'.format(kind), self.datatypes[datatypes[id]])
+                self.end('ATTRIBUTE-DEFINITION-' + kind)
+            self.end('SPEC-ATTRIBUTES')
+            self.end('SPEC-OBJECT-TYPE')
+        self.element('SPEC-RELATION-TYPE', self.identifiable('srt-implements', 'Implements or tests'))
+        self.element('SPECIFICATION-TYPE', self.identifiable('spt-rfc', 'RFC'))
+        self.end('SPEC-TYPES')
+
+    def write_value(self, type_id, attribute_id, value):
+        kind = self.attribute_kinds[attribute_id]
+        definition = type_id + '-' + attribute_id
+        tag = 'ATTRIBUTE-VALUE-' + kind
+        if kind == 'ENUMERATION':
+            self.start(tag)
+            self.ref('DEFINITION', 'ATTRIBUTE-DEFINITION-ENUMERATION-REF', definition)
+            self.ref('VALUES', 'ENUM-VALUE-REF', 'ev-' + value)
+        else:
+            self.start(tag, {'THE-VALUE': str(value)})
+            self.ref('DEFINITION', 'ATTRIBUTE-DEFINITION-{0}-REF'.format(kind), definition)
+        self.end(tag)
+
+    def write_object(self, identifier, obj, values):
+        if isinstance(obj, Section):
+            type_id = 'st-section'
+            attributes = [('ad-reqid', values.id), ('ad-name', obj.heading)]
+        else:
+            type_id = 'st-paragraph' if isinstance(obj, Paragraph) else 'st-clause'
+            if isinstance(obj, Paragraph) and obj.clauses:
+                text = None
+            else:
+                text = values.text
+            attributes = [('ad-reqid', values.id), ('ad-text', text), ('ad-importance', values.importance)]
+        self.start('SPEC-OBJECT', self.identifiable(identifier, values.id or None))
+        self.start('VALUES')
+        for attribute_id, value in attributes:
+            if value:
+                self.write_value(type_id, attribute_id, value)
+        self.end('VALUES')
+        self.ref('TYPE', 'SPEC-OBJECT-TYPE-REF', type_id)
+        self.end('SPEC-OBJECT')
+
+    def write_coderef(self, identifier, ref):
+        coderef = ref.as_xml()
+        self.start('SPEC-OBJECT', self.identifiable(identifier, '{0}:{1}'.format(ref.filename, ref.linenum)))
+        self.start('VALUES')
+        self.write_value('st-coderef', 'ad-path', ref.filename)
+        self.write_value('st-coderef', 'ad-line', ref.linenum)
+        self.write_value('st-coderef', 'ad-reftype', coderef.get('type'))
+        self.end('VALUES')
+        self.ref('TYPE', 'SPEC-OBJECT-TYPE-REF', 'st-coderef')
+        self.end('SPEC-OBJECT')
+
+
+# Marks where the sections go in the serialized document, which is
+# written around them
+SECTIONS_PLACEHOLDER = 'sections'
+
+
+class Sink:
+    """An output format written by an Emitter.
+
+    Each method is called once for the corresponding point of the
+    traversal, with the Values shared by all the sinks.
+    """
+    def start_document(self, doc):
+        pass
+
+    def start_section(self, section, values):
+        pass
+
+    def start_paragraph(self, paragraph, values):
+        pass
+
+    def clause(self, clause, values):
+        pass
+
+    def end_paragraph(self, paragraph):
+        pass
+
+    def end_section(self, section):
+        pass
+
+    def end_document(self, doc):
+        pass
+
+
+class Emitter:
+    """Writes a document to any number of Sinks in a single traversal.
+
+    If release is set, the paragraphs of each section are dropped once
+    they have been written, so a lazily parsed document never holds more
+    than one section's paragraphs and clauses.
+    """
+    def __init__(self, sinks, release=False):
+        self.sinks = sinks
+        self.release = release
+
+    def emit(self, doc):
+        sinks = self.sinks
+        for sink in sinks:
+            sink.start_document(doc)
+        for section in doc.sections:
+            values = Values(section)
+            for sink in sinks:
+                sink.start_section(section, values)
+            for paragraph in section.paragraphs:
+                values = Values(paragraph)
+                for sink in sinks:
+                    sink.start_paragraph(paragraph, values)
+                for clause in paragraph.clauses:
+                    values = Values(clause)
+                    for sink in sinks:
+                        sink.clause(clause, values)
+                for sink in sinks:
+                    sink.end_paragraph(paragraph)
+            for sink in sinks:
+                sink.end_section(section)
+            if self.release:
+                section._paragraphs = None
+        for sink in sinks:
+            sink.end_document(doc)
+
+
+def split_placeholder(root, parent):
+    """Serialize root with a placeholder at the end of parent, and return the text before and after it."""
+    parent.append(etree.Comment(SECTIONS_PLACEHOLDER))
+    data = etree.tostring(root)
+    before, after = data.split(etree.tostring(etree.Comment(SECTIONS_PLACEHOLDER)), 1)
+    del parent[-1]
+    return before, after
+
+
+class XmlSink(Sink):
+    """Writes the custom XML format to the binary file f, a section at a time."""
+    def __init__(self, f):
+        self.f = f
+
+    def start_document(self, doc):
+        root, sections_elem = doc.start_xml()
+        self.before, self.after = split_placeholder(root, sections_elem)
+        self.f.write(self.before)
+
+    def start_section(self, section, values):
+        self.section_elem = section.start_xml()
+
+    def start_paragraph(self, paragraph, values):
+        self.paragraph_elem = paragraph.start_xml(values)
+        self.section_elem.append(self.paragraph_elem)
+
+    def clause(self, clause, values):
+        self.paragraph_elem.append(clause.as_xml(values))
+
+    def end_paragraph(self, paragraph):
+        paragraph.end_xml(self.paragraph_elem)
+        self.paragraph_elem = None
+
+    def end_section(self, section):
+        self.f.write(etree.tostring(self.section_elem))
+        self.section_elem = None
+
+    def end_document(self, doc):
+        self.f.write(self.after)
+
+
+class HtmlSink(Sink):
+    """Writes the HTML rendering to the binary file f, a paragraph at a time."""
+    def __init__(self, f):
+        self.f = f
+
+    def start_document(self, doc):
+        root, body = doc.start_html()
+        self.before, self.after = split_placeholder(root, body)
+        self.f.write(b'<!DOCTYPE html>\n')
+        self.f.write(self.before)
+
+    def start_section(self, section, values):
+        self.f.write(etree.tostring(section.heading_html()))
+
+    def start_paragraph(self, paragraph, values):
+        self.paragraph_elem = paragraph.start_html(values)
+
+    def clause(self, clause, values):
+        self.paragraph_elem.append(clause.as_html(values))
+
+    def end_paragraph(self, paragraph):
+        paragraph.end_html(self.paragraph_elem)
+        self.f.write(etree.tostring(self.paragraph_elem))
+        self.paragraph_elem = None
+
+    def end_document(self, doc):
+        self.f.write(self.after)
+
+
+class JsonLinesSink(Sink):
+    """Writes one compact JSON object per clause to the binary file f.
+
+    Each line stands alone, so the output of several documents can be
+    concatenated, and split anywhere between lines for processing.
+    """
+    def __init__(self, f):
+        self.f = f
+
+    def start_document(self, doc):
+        self.rfc_number = doc.rfc_number
+
+    def start_section(self, section, values):
+        self.section_id = values.id
+
+    def start_paragraph(self, paragraph, values):
+        self.paragraph_id = values.id
 
-        return b'<!DOCTYPE html>\n' + etree.tostring(root)
+    def clause(self, clause, values):
+        record = {
+                'rfc': self.rfc_number,
+                'section': self.section_id,
+                'paragraph': self.paragraph_id,
+                'clause': values.id,
+                'importance': values.importance,
+                'text': values.text,
+                'start': clause.substrings[0].start,
+                'end': clause.substrings[-1].end,
+                }
+        self.f.write(json.dumps(record, separators=(',', ':')).encode('utf-8'))
+        self.f.write(b'\n')
 
-    def as_reqif(self):
-        root = etree.Element('REQ-IF',
-                number=str(self.rfc_number),
-                title=self.title,
-                )
 
-        root.text = '\n'
-        header_elem = etree.Element('THE-HEADER')
-        header_elem.text = '\n'
-        #for key in sorted(self.header.keys()):
-        #    elem = etree.Element('value', name=key)
-        #    elem.text = self.header[key]
-        #    elem.tail = '\n'
-        #    header_elem.append(elem)
-        header_elem.tail = '\n\n'
-        root.append(header_elem)
+class ReqifSink(Sink):
+    """Writes the ReqIF format to the binary file f.
 
-        core_content = etree.Element('CORE-CONTENT')
-        req_if_content = etree.Element('REQ-IF-CONTENT')
-        # TODO
-        core_content.append(req_if_content)
-        root.append(core_content)
+    The SPEC-OBJECTS are written as the document is traversed; the code
+    references and the SPECIFICATION hierarchy follow at the end, from
+    the identifiers recorded on the way.
+    """
+    def __init__(self, f, refs=None, last_change=None):
+        self.f = f
+        self.refs = refs
+        self.last_change = last_change
 
-        #sections_elem = etree.Element('sections')
-        #sections_elem.text = '\n\n'
-        #for section in self.sections:
-        #    sections_elem.append(section.as_xml())
-        #sections_elem.tail = '\n'
-        #root.append(sections_elem)
+    def start_document(self, doc):
+        self.writer = ReqifWriter(self.f, 'rfc{0}'.format(doc.rfc_number), self.last_change)
+        self.writer.start_document(doc, self.refs)
 
-        return etree.ElementTree(root)
+    def start_section(self, section, values):
+        self.writer.add(0, section, values)
+
+    def start_paragraph(self, paragraph, values):
+        self.writer.add(1, paragraph, values)
+
+    def clause(self, clause, values):
+        self.writer.add(2, clause, values)
+
+    def end_document(self, doc):
+        self.writer.end_document()
 
 
 def split_lines(doc, text):
@@ -457,7 +1003,13 @@ def split_lines(doc, text):
         line_num += 1
 
 
-def parse(text, sha1):
+def parse(text, sha1, lazy=False):
+    """Parse the text of an RFC.
+
+    If lazy is set, only the header and the section headings are parsed
+    here, and each section is split into paragraphs and clauses when
+    they are first accessed.
+    """
     doc = Document(text, sha1)
     lines = list(split_lines(doc, text))
     doc.lines = lines
@@ -495,31 +1047,19 @@ def parse(text, sha1):
     doc.title = lines[i].text.strip()
     i += 1
 
-    # Extract sections
+    # Find the section headings. Only the boundaries of each section are
+    # recorded here: paragraphs and clauses are split out later.
     header_start = 'RFC {0}'.format(doc.rfc_number)
     section = None
-    paragraph = None
-    while True:
-        # Skip blank lines
-        while i < num_lines and lines[i].is_blank:
+    while i < num_lines:
+        if lines[i].is_blank:
             i += 1
-            # Blank lines alone aren't always the end of a paragraph
-            # because a paragraph may be split across two pages.
-            if paragraph and paragraph.has_ended:
-                paragraph.parse()
-                paragraph = None
-        if i == num_lines:
-            break
+            continue
         line = lines[i].text
         if line.startswith(' '):
             # Section body
             if section is None:
                 raise ParseException(lines[i].num, 'Expected section heading')
-            else:
-                if paragraph is None:
-                    paragraph = Paragraph(section, len(section.paragraphs) + 1)
-                    section.paragraphs.append(paragraph)
-                paragraph.lines.append(lines[i])
         elif len(line) == 72 and line.startswith(header_start):
             # This is a page header
             assert line.find(doc.title) != -1
@@ -532,46 +1072,107 @@ def parse(text, sha1):
             pass
         else:
             # Section heading
-            section = Section(doc, line)
+            if section:
+                section.end = i
+            section = Section(doc, line, i + 1)
             doc.sections.append(section)
-            paragraph = None
         i += 1
+    if section:
+        section.end = num_lines
+
+    if not lazy:
+        for section in doc.sections:
+            for paragraph in section.paragraphs:
+                paragraph.clauses
 
     return doc
 
 
-def parse_path(path):
-    with open(path, 'rb') as f:
-        data = f.read()
-        sha1 = hashlib.sha1(data).hexdigest()
-        doc = parse(data.decode('us-ascii'), sha1)
-    return doc
+# Openers for compressed documents, by file extension
+COMPRESSED_OPENERS = {
+        '.gz': gzip.open,
+        '.xz': lzma.open,
+        }
+
+CHUNK_SIZE = 1 << 16
+
+
+def is_text_path(path):
+    """Return whether path names a plain text RFC, possibly compressed."""
+    for ext in COMPRESSED_OPENERS:
+        if path.endswith(ext):
+            path = path[:-len(ext)]
+            break
+    return path.endswith('.txt')
+
+
+def parse_path(path, lazy=False):
+    """Parse an RFC from a .txt file, or a .txt.gz or .txt.xz file.
+
+    The sha1 is always that of the uncompressed text, so it doesn't
+    depend on how the document was stored.
+    """
+    opener = open
+    for ext, compressed_opener in COMPRESSED_OPENERS.items():
+        if path.endswith(ext):
+            opener = compressed_opener
+    h = hashlib.sha1()
+    chunks = []
+    with opener(path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            h.update(chunk)
+            chunks.append(chunk)
+    data = b''.join(chunks)
+    return parse(data.decode('us-ascii'), h.hexdigest(), lazy)
 
 
 def main():
     import argparse
     parser = argparse.ArgumentParser(description='Split an IETF RFC into clauses')
     parser.add_argument('input', metavar='rfcNNNN.txt', nargs=1, type=str,
-            help='The path to the input RFC document in plain text format (.txt)')
+            help='The path to the input RFC document in plain text format (.txt), optionally compressed (.txt.gz, .txt.xz)')
     parser.add_argument('--xml', dest='output_xml', nargs=1, type=str,
             help='The path to a custom XML output file')
     parser.add_argument('--html', dest='output_html', nargs=1, type=str,
             help='The path to an HTML output file')
-    #parser.add_argument('--reqif', dest='output_reqif', nargs=1, type=str,
-    #        help='The path to a ReqIF XML output file')
+    parser.add_argument('--reqif', dest='output_reqif', nargs=1, type=str,
+            help='The path to a ReqIF XML output file')
+    parser.add_argument('--jsonl', dest='output_jsonl', nargs=1, type=str,
+            help='The path to a JSON lines output file, with one record per clause')
+    parser.add_argument('--ref', dest='ref', nargs='+', type=str,
+            help='The path to one or more .req files or directories of code references to include in the ReqIF output')
     args = parser.parse_args()
 
-    doc = parse_path(args.input[0])
-    if args.output_xml:
-        xml = doc.as_xml()
-        xml.write(args.output_xml[0])
-    if args.output_html:
-        html = doc.as_html()
-        with open(args.output_html[0], 'wb') as f:
-            f.write(html)
-    #if args.output_reqif:
-    #    xml = doc.as_reqif()
-    #    xml.write(args.output_reqif[0])
+    # Sections are parsed as they are reached, and every output is
+    # written in the same traversal of the document.
+    doc = parse_path(args.input[0], lazy=True)
+    files = []
+    sinks = []
+    try:
+        if args.output_xml:
+            files.append(open(args.output_xml[0], 'wb'))
+            sinks.append(XmlSink(files[-1]))
+        if args.output_html:
+            files.append(open(args.output_html[0], 'wb'))
+            sinks.append(HtmlSink(files[-1]))
+        if args.output_reqif:
+            refs = None
+            if args.ref:
+                from rfc_notes import References
+                refs = References()
+                refs.load_paths(args.ref, ('rfc', str(doc.rfc_number)))
+            files.append(open(args.output_reqif[0], 'wb'))
+            sinks.append(ReqifSink(files[-1], refs))
+        if args.output_jsonl:
+            files.append(open(args.output_jsonl[0], 'wb'))
+            sinks.append(JsonLinesSink(files[-1]))
+        Emitter(sinks, release=True).emit(doc)
+    finally:
+        for f in files:
+            f.close()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+# Keeps the line numbers of <coderef> elements in an annotated RFC (the
+# input to unextract.py) in step with edits to the OCaml source code.
+#
+# "record" saves a hash of every line of each referenced source file.
+# After the code has been edited, "update" diffs the recorded hashes
+# against the current files and moves each <coderef line="..."> to the
+# new number of the same line.
+#
+# A coderef whose line was changed or deleted keeps its old number and is
+# marked stale="yes", while the other coderefs to the file are moved and
+# the file is recorded again. Stale coderefs are reported by every update
+# until the line is corrected by hand and the stale attribute removed.
+
+import difflib
+import hashlib
+import json
+import os.path
+import re
+import sys
+import xml.etree.ElementTree as etree
+
+from rfc_notes import ParseException
+
+
+ANCHORS_VERSION = 1
+
+# Attributes added by unextract.py shouldn't stop a line from matching.
+REF_ATTR = re.compile(r'\s*\[@ref [^\]]*\]')
+
+
+def line_hash(line):
+    text = REF_ATTR.sub('', line).strip()
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def file_hashes(path):
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return [line_hash(line) for line in f]
+
+
+def map_lines(old, new):
+    """Map 1-based line numbers in old to line numbers in new.
+
+    Both arguments are lists of line hashes. Lines inside unchanged
+    regions of the diff are mapped directly. A line inside a changed
+    region is still mapped if its hash occurs exactly once in both
+    versions, which handles code that has been moved.
+    Lines that cannot be relocated are absent from the result.
+    """
+    mapping = {}
+    matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            for k in range(i2 - i1):
+                mapping[i1 + k + 1] = j1 + k + 1
+    if len(mapping) < len(old):
+        old_counts = {}
+        for h in old:
+            old_counts[h] = old_counts.get(h, 0) + 1
+        new_index = {}
+        for j, h in enumerate(new):
+            new_index[h] = -1 if h in new_index else j
+        for i, h in enumerate(old):
+            if i + 1 not in mapping and old_counts[h] == 1 and new_index.get(h, -1) != -1:
+                mapping[i + 1] = new_index[h] + 1
+    return mapping
+
+
+def load_anchors(path):
+    with open(path, 'r') as f:
+        anchors = json.load(f)
+    if anchors.get('version') != ANCHORS_VERSION:
+        raise ParseException('Unsupported anchors file version in {0}'.format(path))
+    return anchors['files']
+
+
+def save_anchors(path, files):
+    with open(path, 'w') as f:
+        json.dump({'version': ANCHORS_VERSION, 'files': files}, f, sort_keys=True, separators=(',', ':'))
+        f.write('\n')
+
+
+def coderefs_by_path(xml):
+    by_path = {}
+    for coderef in xml.iter('coderef'):
+        path = coderef.get('path')
+        if path and coderef.get('line'):
+            by_path.setdefault(path, []).append(coderef)
+    return by_path
+
+
+def record(xml, src_dir):
+    """Return the line hashes of every source file referenced by the notes."""
+    files = {}
+    for path in coderefs_by_path(xml):
+        try:
+            files[path] = file_hashes(os.path.join(src_dir, path))
+        except OSError:
+            pass
+    return files
+
+
+def reconcile(xml, src_dir, anchors):
+    """Update the line numbers of the coderefs in xml.
+
+    Returns the new anchors and a list of (coderef, reason) pairs for the
+    coderefs that could not be relocated, which are left unchanged.
+    Coderefs whose line was changed or deleted are marked stale, so the
+    rest of the file can be recorded again without losing track of them.
+    Files with no recorded version get no anchors.
+    """
+    new_anchors = {}
+    failures = []
+    for path, all_coderefs in coderefs_by_path(xml).items():
+        coderefs = []
+        for coderef in all_coderefs:
+            if coderef.get('stale'):
+                failures.append((coderef, 'line was changed or deleted by an earlier update'))
+            elif not coderef.get('line').isdigit():
+                failures.append((coderef, 'line is not a number'))
+            else:
+                coderefs.append(coderef)
+        old = anchors.get(path)
+        try:
+            new = file_hashes(os.path.join(src_dir, path))
+        except OSError:
+            if old is not None:
+                new_anchors[path] = old
+            failures.extend((coderef, 'source file not found') for coderef in coderefs)
+            continue
+        if old is None:
+            failures.extend((coderef, 'no recorded version of the source file') for coderef in coderefs)
+            continue
+        if old == new:
+            new_anchors[path] = new
+            continue
+        mapping = map_lines(old, new)
+        for coderef in coderefs:
+            line = mapping.get(int(coderef.get('line')))
+            if line is None:
+                coderef.set('stale', 'yes')
+                failures.append((coderef, 'line was changed or deleted'))
+            else:
+                coderef.set('line', str(line))
+        new_anchors[path] = new
+    return new_anchors, failures
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Keep the line numbers of code references in an annotated IETF RFC up to date with the source code')
+    parser.add_argument('command', choices=['record', 'update'],
+            help='"record" saves the current state of the source code, "update" relocates code references to match changes made since then')
+    parser.add_argument('input', metavar='rfcNNNN_notes.xml', nargs=1, type=str,
+            help='The path to the input XML document (.xml)')
+    parser.add_argument('--src', dest='src', default='.', type=str,
+            help='The root directory containing the source code')
+    parser.add_argument('--anchors', dest='anchors', required=True, type=str,
+            help='The path to the file containing the recorded line hashes')
+    parser.add_argument('--out', dest='out', type=str,
+            help='The path to the updated XML document, by default the input is replaced')
+    args = parser.parse_args()
+
+    doc = etree.parse(args.input[0])
+    if args.command == 'record':
+        save_anchors(args.anchors, record(doc.getroot(), args.src))
+        return
+
+    anchors = load_anchors(args.anchors)
+    new_anchors, failures = reconcile(doc.getroot(), args.src, anchors)
+    doc.write(args.out or args.input[0])
+    save_anchors(args.anchors, new_anchors)
+    for coderef, reason in failures:
+        sys.stderr.write('{0}:{1}: could not relocate reference: {2}\n'.format(
+            coderef.get('path'), coderef.get('line'), reason))
+    if failures:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
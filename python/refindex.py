@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+
+# An index from source code locations to the requirements they refer to,
+# answering "which clauses does mdns.ml:120 implement?".
+#
+# For each source file the index holds a sorted array of line numbers and
+# a parallel array of targets, so a lookup is a binary search. Each target
+# is a (type, docid, reqid) triple, with the text and importance of the
+# clause taken from the annotated XML when it is available.
+
+import array
+import bisect
+import json
+import sys
+import xml.etree.ElementTree as etree
+
+from rfc_notes import ParseException, References, docid_as_text, docid_of_text, element_text
+
+
+INDEX_VERSION = 1
+BINARY_HEADER = b'# reqtrace location index 2\n'
+
+
+class Location:
+    __slots__ = ['filename', 'line', 'type', 'docid', 'reqid', 'importance', 'text']
+
+    def __init__(self, filename, line, type, docid, reqid, importance, text):
+        self.filename = filename
+        self.line = line
+        self.type = type
+        self.docid = docid
+        self.reqid = reqid
+        self.importance = importance
+        self.text = text
+
+
+class LocationIndex:
+    def __init__(self):
+        # (type, docid, reqid) for each target, and the index of each in the list
+        self.targets = []
+        self.target_indexes = {}
+        # (docid, reqid) -> (importance, text)
+        self.clauses = {}
+        # filename -> (sorted array of lines, array of target indexes)
+        self.files = {}
+        self.pending = {}
+
+    @classmethod
+    def from_references(cls, refs, notes_roots=()):
+        index = cls()
+        for root in notes_roots:
+            index.add_notes(root)
+        index.add_references(refs)
+        index.finish()
+        return index
+
+    def target(self, type, docid, reqid):
+        key = (type, docid, reqid)
+        i = self.target_indexes.get(key)
+        if i is None:
+            i = self.target_indexes[key] = len(self.targets)
+            self.targets.append(key)
+        return i
+
+    def add(self, filename, line, target):
+        self.pending.setdefault(filename, []).append((line, target))
+
+    def add_references(self, refs):
+        for reqid, references in refs.references.items():
+            for ref in references:
+                self.add(ref.filename, ref.linenum, self.target(ref.reftype, ref.doc, reqid))
+
+    def add_notes(self, root):
+        """Add the clause text and importance, and the <coderef> elements, of an annotated RFC."""
+        docid = ('rfc', root.get('number'))
+        sections = root.find('sections')
+        if sections is None:
+            return
+        for elem in sections.iter():
+            if elem.tag not in ('section', 'paragraph', 'clause'):
+                continue
+            id = elem.get('id')
+            if not id:
+                continue
+            self.clauses[(docid, id)] = (elem.get('importance'), element_text(elem))
+            for notes in elem.findall('notes'):
+                for coderef in notes.findall('coderef'):
+                    line = coderef.get('line')
+                    if coderef.get('path') and line:
+                        target = self.target(coderef.get('type', 'code'), docid, id)
+                        self.add(coderef.get('path'), int(line), target)
+
+    def finish(self):
+        """Sort the locations added since the last call into the per-file arrays."""
+        for filename, entries in self.pending.items():
+            lines, targets = self.files.get(filename, ((), ()))
+            entries.extend(zip(lines, targets))
+            entries = sorted(set(entries))
+            self.files[filename] = (array.array('q', [line for line, target in entries]),
+                    array.array('q', [target for line, target in entries]))
+        self.pending = {}
+
+    def resolve(self, filename):
+        """Return the indexed filename matching filename, allowing either to be a suffix of the other.
+
+        Returns None if no name matches, and raises ValueError if several
+        do, e.g. foo.ml when both lib/foo.ml and test/foo.ml are indexed.
+        """
+        if filename in self.files:
+            return filename
+        names = [name for name in self.files
+                if filename.endswith('/' + name) or name.endswith('/' + filename)]
+        if len(names) > 1:
+            raise ValueError('{0} is ambiguous, it could be any of {1}'.format(filename, ', '.join(sorted(names))))
+        return names[0] if names else None
+
+    def lookup(self, filename, first, last=None):
+        """Return the Locations in filename between lines first and last inclusive.
+
+        Raises ValueError if filename matches several indexed files.
+        """
+        name = self.resolve(filename)
+        if name is None:
+            return []
+        if last is None:
+            last = first
+        lines, targets = self.files[name]
+        lo = bisect.bisect_left(lines, first)
+        hi = bisect.bisect_right(lines, last)
+        return [self.location(name, lines[i], targets[i]) for i in range(lo, hi)]
+
+    def location(self, filename, line, target):
+        type, docid, reqid = self.targets[target]
+        importance, text = self.clauses.get((docid, reqid), (None, None))
+        return Location(filename, line, type, docid, reqid, importance, text)
+
+    def as_json(self):
+        return {
+                'version': INDEX_VERSION,
+                'targets': [[type, docid_as_text(docid), reqid] for type, docid, reqid in self.targets],
+                'clauses': [[docid_as_text(docid), reqid, importance, text]
+                    for (docid, reqid), (importance, text) in self.clauses.items()],
+                'files': {filename: [list(lines), list(targets)] for filename, (lines, targets) in self.files.items()},
+                }
+
+    @classmethod
+    def of_json(cls, data):
+        if data.get('version') != INDEX_VERSION:
+            raise ParseException('Unsupported location index version')
+        index = cls()
+        for type, docid, reqid in data['targets']:
+            index.target(type, docid_of_text(docid), reqid)
+        for docid, reqid, importance, text in data['clauses']:
+            index.clauses[(docid_of_text(docid), reqid)] = (importance, text)
+        for filename, (lines, targets) in data['files'].items():
+            index.files[filename] = (array.array('q', lines), array.array('q', targets))
+        return index
+
+    def save_json(self, f):
+        json.dump(self.as_json(), f, separators=(',', ':'))
+        f.write('\n')
+
+    @classmethod
+    def load_json(cls, f):
+        return cls.of_json(json.load(f))
+
+    def save_binary(self, f):
+        """Write a JSON header with the targets, clauses and file names, followed by the arrays.
+
+        The arrays are 64-bit integers in this machine's byte order, which
+        is recorded in the header so other machines can swap them on load.
+        """
+        data = self.as_json()
+        data['files'] = [[filename, len(lines)] for filename, (lines, targets) in self.files.items()]
+        data['byteorder'] = sys.byteorder
+        f.write(BINARY_HEADER)
+        f.write(json.dumps(data, separators=(',', ':')).encode('utf-8') + b'\n')
+        for lines, targets in self.files.values():
+            lines.tofile(f)
+            targets.tofile(f)
+
+    @classmethod
+    def load_binary(cls, f):
+        if f.readline() != BINARY_HEADER:
+            raise ParseException('Not a binary location index')
+        data = json.loads(f.readline().decode('utf-8'))
+        files = data['files']
+        data['files'] = {}
+        index = cls.of_json(data)
+        for filename, count in files:
+            lines = array.array('q')
+            lines.fromfile(f, count)
+            targets = array.array('q')
+            targets.fromfile(f, count)
+            if data['byteorder'] != sys.byteorder:
+                lines.byteswap()
+                targets.byteswap()
+            index.files[filename] = (lines, targets)
+        return index
+
+
+def load_index(path):
+    with open(path, 'rb') as f:
+        binary = f.read(len(BINARY_HEADER)) == BINARY_HEADER
+    if binary:
+        with open(path, 'rb') as f:
+            return LocationIndex.load_binary(f)
+    with open(path, 'r') as f:
+        return LocationIndex.load_json(f)
+
+
+def parse_location(text):
+    """Parse file:line or file:first-last into (file, first, last)."""
+    filename, sep, lines = text.rpartition(':')
+    if not sep:
+        raise ValueError('expected file:line, not {0}'.format(text))
+    first, sep, last = lines.partition('-')
+    return filename, int(first), int(last) if sep else int(first)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Find the requirements referred to from locations in source code')
+    parser.add_argument('locations', metavar='file:line', nargs='*', type=str,
+            help='Locations to look up, as file:line or file:first-last')
+    parser.add_argument('--ref', dest='ref', nargs='+', default=[], type=str,
+            help='The path to one or more input XML files containing requirement references extracted from OCaml code, directories or tar archives of them')
+    parser.add_argument('--notes', dest='notes', nargs='+', default=[], type=str,
+            help='The paths to annotated XML documents, for the text of clauses and their <coderef> elements')
+    parser.add_argument('--load', dest='load', type=str,
+            help='The path to an index saved by --json or --binary, instead of --ref and --notes')
+    parser.add_argument('--json', dest='json', type=str,
+            help='The path to a JSON output file for the index')
+    parser.add_argument('--binary', dest='binary', type=str,
+            help='The path to a binary output file for the index, which is faster to load')
+    args = parser.parse_args()
+
+    if args.load:
+        index = load_index(args.load)
+    else:
+        refs = References()
+        refs.load_paths(args.ref, None)
+        index = LocationIndex.from_references(refs, [etree.parse(path).getroot() for path in args.notes])
+    if args.json:
+        with open(args.json, 'w') as f:
+            index.save_json(f)
+    if args.binary:
+        with open(args.binary, 'wb') as f:
+            index.save_binary(f)
+    for text in args.locations:
+        try:
+            filename, first, last = parse_location(text)
+            locations = index.lookup(filename, first, last)
+        except ValueError as e:
+            parser.error(str(e))
+        for loc in locations:
+            print('{0}:{1}: {2} {3} {4} {5}: {6}'.format(loc.filename, loc.line, loc.type,
+                docid_as_text(loc.docid), loc.reqid, loc.importance or '-', loc.text or ''))
+
+if __name__ == '__main__':
+    main()
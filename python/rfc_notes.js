@@ -1,19 +1,40 @@
-// http://stackoverflow.com/questions/195951/change-an-elements-css-class-with-javascript
+// Kept for pages generated before the delegated listeners below.
 function hasClass(element, cls) {
-    return element.className.match(new RegExp('(\\s|^)' + cls + '(\\s|$)'));
+    return element.classList.contains(cls);
 }
 function addClass(element, cls) {
-    if (!hasClass(element, cls)) {
-        if (element.className.substr(-1) == " ") {
-            element.className += cls;
-        } else {
-            element.className += " " + cls;
-        }
-    }
+    element.classList.add(cls);
 }
 function removeClass(element, cls) {
-    if (hasClass(element, cls)) {
-        var reg = new RegExp('(\\s|^)' + cls + '(\\s|$)');
-        element.className = element.className.replace(reg, ' ');
+    element.classList.remove(cls);
+}
+
+// A single set of listeners on the document handles every notes div,
+// rather than inline handlers on each one.
+function notesTarget(event) {
+    var notes = event.target.closest ? event.target.closest('div.notes[data-target]') : null;
+    if (!notes || (event.relatedTarget && notes.contains(event.relatedTarget))) {
+        return null;
     }
+    return document.getElementById(notes.getAttribute('data-target'));
 }
+document.addEventListener('mouseover', function (event) {
+    var target = notesTarget(event);
+    if (target) {
+        target.classList.add('hover');
+    }
+});
+document.addEventListener('mouseout', function (event) {
+    var target = notesTarget(event);
+    if (target) {
+        target.classList.remove('hover');
+    }
+});
+
+// Clicking a section heading collapses or expands the section.
+document.addEventListener('click', function (event) {
+    var heading = event.target.closest ? event.target.closest('div.section > h2') : null;
+    if (heading) {
+        heading.parentNode.classList.toggle('collapsed');
+    }
+});
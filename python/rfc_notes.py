@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 
+import collections
+import copy
+import hashlib
+import io
 import os
 import os.path
 import re
+import tarfile
+import threading
 import xml.etree.ElementTree as etree
 
 
@@ -54,7 +60,14 @@ def coderef_as_element(coderef, base):
         a.text = a_text
         elem.append(a)
     else:
-        elem.text = coderef_type + ': ' + path + ':' + line
+        elem.text = coderef_type + ': ' + path
+        if line:
+            elem.text += ':' + line
+    snippet = coderef.find('snippet')
+    if snippet is not None:
+        pre = etree.SubElement(elem, 'pre')
+        pre.set('class', 'snippet')
+        pre.text = snippet.text
     elem.tail = '\n'
     return elem
 
@@ -73,18 +86,13 @@ def ref_as_element(ref):
     return elem
 
 
-def notes_as_element(note, target_id, refs, base):
+def notes_as_element(note, target_id, base):
     elem = etree.Element('div')
     if target_id:
-        elem.set('onmouseover', "addClass(document.getElementById('{0}'), 'hover')".format(target_id))
-        elem.set('onmouseout', "removeClass(document.getElementById('{0}'), 'hover')".format(target_id))
+        # Hover highlighting is handled by a delegated listener in rfc_notes.js
+        elem.set('data-target', target_id)
     elem.set('class', 'notes')
     elem.text = '\n'
-    if target_id in refs.references:
-        for ref in refs.references[target_id]:
-            #elem.append(coderef_as_element(ref.as_xml(), base))
-            note.append(ref.as_xml())
-        del refs.references[target_id]
     for child in note:
         if child.tag == 'note':
             elem.append(note_as_element(child))
@@ -96,7 +104,7 @@ def notes_as_element(note, target_id, refs, base):
     return elem
 
 
-def clause_as_element(clause, refs, base):
+def clause_as_element(clause, base):
     elem = etree.Element('div')
     id = clause.get('id')
     if id:
@@ -109,16 +117,10 @@ def clause_as_element(clause, refs, base):
         css_class += ' ' + importance
     elem.set('class', css_class)
 
-    if id in refs.references:
-        #elem.insert(0, notes_as_element(etree.Element('notes'), id, refs, base))
-        notes = clause.find('notes')
-        if notes is None:
-            notes = etree.Element('notes')
-            clause.append(notes)
     # For editing the XML it is nicer to have <notes> after
     # the text, but for the HTML it looks better before the text.
     for notes in clause.findall('notes'):
-        elem.append(notes_as_element(notes, id, refs, base))
+        elem.append(notes_as_element(notes, id, base))
 
     label = etree.Element('span')
     label.set('class', 'label')
@@ -129,7 +131,7 @@ def clause_as_element(clause, refs, base):
     return elem
 
 
-def paragraph_as_element(paragraph, section, refs, base):
+def paragraph_as_element(paragraph, section, base):
     elem = etree.Element('div')
     elem.set('class', 'paragraph')
     elem.text = '\n'
@@ -141,26 +143,20 @@ def paragraph_as_element(paragraph, section, refs, base):
         pre.text = '\n'.join(line.text for line in paragraph.findall('line'))
         elem.append(pre)
     else:
-        if id in refs.references:
-            #elem.insert(0, notes_as_element(etree.Element('notes'), id, refs, base))
-            notes = paragraph.find('notes')
-            if notes is None:
-                notes = etree.Element('notes')
-                paragraph.append(notes)
         for child in paragraph:
             if child.tag == 'clause':
-                clause = clause_as_element(child, refs, base)
+                clause = clause_as_element(child, base)
                 elem.append(clause)
             elif child.tag == 'line':
                 elem.append(line_as_element(child))
             elif child.tag == 'notes':
-                div = notes_as_element(child, id, refs, base)
+                div = notes_as_element(child, id, base)
                 elem.insert(0, div)
     elem.tail = '\n\n'
     return elem
 
 
-def section_as_elements(section, refs, base):
+def section_as_elements(section, base):
     h = etree.Element('h2')
     elements = [h]
     name = section.get('name')
@@ -177,12 +173,24 @@ def section_as_elements(section, refs, base):
     h.tail = '\n\n'
     for child in section:
         if child.tag == 'paragraph':
-            elements.append(paragraph_as_element(child, section, refs, base))
+            elements.append(paragraph_as_element(child, section, base))
         elif child.tag == 'notes':
-            elements.insert(0, notes_as_element(child, id, refs, base))
+            elements.insert(0, notes_as_element(child, id, base))
     return elements
 
 
+def element_text(elem):
+    """Return the text of a section heading, paragraph or clause in the XML."""
+    if elem.tag == 'section':
+        return elem.get('name', '')
+    elif elem.tag == 'clause':
+        return ' '.join(sub.text or '' for sub in elem.findall('linesub'))
+    clauses = elem.findall('clause')
+    if clauses:
+        return ' '.join(element_text(clause) for clause in clauses)
+    return ' '.join((line.text or '').strip() for line in elem.findall('line'))
+
+
 def table_of_clauses(clauses):
     table = etree.Element('table')
     table.set('class', 'index')
@@ -241,13 +249,199 @@ def index_clauses(root):
     return elements
 
 
-def root_as_html(xml, refs, base):
+def join_references(xml, refs):
+    """Return a copy of xml with references added to the <notes> of the elements they target.
+
+    This is done before rendering so that each section subtree contains
+    everything needed to render it, and so that index_clauses can find
+    the resulting <coderef> elements. Neither xml nor refs is modified,
+    so both can be shared between renders.
+    """
+    xml = copy.deepcopy(xml)
+    joined = set()
+
+    def attach(elem, create):
+        id = elem.get('id')
+        if id not in refs.references or id in joined:
+            return
+        notes = elem.find('notes')
+        if notes is None:
+            if not create:
+                return
+            notes = etree.Element('notes')
+            elem.append(notes)
+        for ref in refs.references[id]:
+            notes.append(ref.as_xml())
+        joined.add(id)
+
+    sections = xml.find('sections')
+    for section in sections.findall('section'):
+        # Section references are only shown if the section has notes.
+        attach(section, False)
+        if section.get('name') == 'Table of Contents':
+            continue
+        for paragraph in section.findall('paragraph'):
+            attach(paragraph, True)
+            for clause in paragraph.findall('clause'):
+                attach(clause, True)
+    return xml
+
+
+def line_offsets(data):
+    """Return the offset of the start of each line, plus the length of data."""
+    offsets = [0]
+    pos = data.find(b'\n')
+    while pos != -1:
+        offsets.append(pos + 1)
+        pos = data.find(b'\n', pos + 1)
+    if offsets[-1] != len(data):
+        offsets.append(len(data))
+    return offsets
+
+
+class SourceSnippets:
+    """Extracts lines of source code surrounding code references.
+
+    The line-offset index of each source file is kept in a bounded LRU
+    cache shared by all references, so each file is scanned once while
+    it stays in the cache and later snippets are read by seeking.
+    """
+    def __init__(self, root, context, max_files=128):
+        self.root = root
+        self.context = context
+        self.max_files = max_files
+        self.indexes = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def snippets(self, path, linenums):
+        """Return a dict mapping each line number to a snippet of text."""
+        full_path = os.path.join(self.root, path)
+        try:
+            f = open(full_path, 'rb')
+        except OSError:
+            return {}
+        result = {}
+        with f:
+            mtime = os.fstat(f.fileno()).st_mtime_ns
+            data = None
+            with self.lock:
+                entry = self.indexes.get(full_path)
+                if entry and entry[0] == mtime:
+                    self.indexes.move_to_end(full_path)
+            if entry and entry[0] == mtime:
+                offsets = entry[1]
+            else:
+                data = f.read()
+                offsets = line_offsets(data)
+                with self.lock:
+                    self.indexes[full_path] = (mtime, offsets)
+                    while len(self.indexes) > self.max_files:
+                        self.indexes.popitem(last=False)
+            num_lines = len(offsets) - 1
+            for linenum in sorted(set(linenums)):
+                first = max(1, linenum - self.context)
+                last = min(num_lines, linenum + self.context)
+                if first > last:
+                    continue
+                start = offsets[first - 1]
+                end = offsets[last]
+                if data is not None:
+                    chunk = data[start:end]
+                else:
+                    f.seek(start)
+                    chunk = f.read(end - start)
+                lines = chunk.decode('utf-8', 'replace').splitlines()
+                result[linenum] = '\n'.join(
+                        '{0:>5}{1} {2}'.format(num, '>' if num == linenum else ':', line)
+                        for num, line in enumerate(lines, first))
+        return result
+
+    def embed(self, xml):
+        """Add a <snippet> to every <coderef> in the notes XML, one file at a time.
+
+        Coderefs without a valid line number are left without a snippet.
+        """
+        by_path = {}
+        for coderef in xml.iter('coderef'):
+            try:
+                linenum = int(coderef.get('line'))
+            except (TypeError, ValueError):
+                continue
+            if coderef.find('snippet') is None:
+                by_path.setdefault(coderef.get('path', ''), []).append((linenum, coderef))
+        for path, coderefs in by_path.items():
+            snippets = self.snippets(path, [linenum for linenum, coderef in coderefs])
+            for linenum, coderef in coderefs:
+                text = snippets.get(linenum)
+                if text is not None:
+                    etree.SubElement(coderef, 'snippet').text = text
+
+
+def section_as_element(section, base):
+    elem = etree.Element('div')
+    elem.set('class', 'section')
+    elem.text = '\n'
+    elem.extend(section_as_elements(section, base))
+    elem.tail = '\n\n'
+    return elem
+
+
+def section_as_html(section, base, cache=None):
+    if cache:
+        key = cache.key(section, base)
+        fragment = cache.get(key)
+        if fragment is not None:
+            return fragment
+    fragment = etree.tostring(section_as_element(section, base))
+    if cache:
+        cache.put(key, fragment)
+    return fragment
+
+
+class SectionCache:
+    """On-disk cache of rendered section fragments.
+
+    Fragments are keyed by a hash of the section's XML subtree after
+    references have been joined into it, so a section is only rendered
+    again when its text, notes or code references change.
+    """
+    VERSION = b'2'
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def key(self, section, base):
+        h = hashlib.sha1(self.VERSION)
+        h.update(base.encode('utf-8'))
+        h.update(b'\0')
+        h.update(etree.tostring(section))
+        return h.hexdigest()
+
+    def get(self, key):
+        try:
+            with open(os.path.join(self.path, key + '.html'), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, fragment):
+        path = os.path.join(self.path, key + '.html')
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(fragment)
+        os.replace(tmp_path, path)
+
+
+SECTIONS_PLACEHOLDER = 'sections'
+
+
+def html_page(title):
     root = etree.Element('html',
             xmlns='http://www.w3.org/1999/xhtml')
 
     head = etree.Element('head')
     head.text = '\n'
-    title = 'RFC {0}: {1}'.format(xml.attrib['number'], xml.attrib['title'])
     title_elem = etree.Element('title')
     title_elem.text = title
     title_elem.tail = '\n'
@@ -264,24 +458,147 @@ def root_as_html(xml, refs, base):
 
     body = etree.Element('body')
     body.text = '\n'
-    
+    body.tail = '\n'
+    root.append(body)
+    return root, body
+
+
+def root_as_html(xml, refs, base, cache=None, snippets=None):
+    title = 'RFC {0}: {1}'.format(xml.attrib['number'], xml.attrib['title'])
+    root, body = html_page(title)
+
     p_links = etree.SubElement(body, 'p')
     p_links.text = 'Jump to: '
     etree.SubElement(p_links, 'a', href='#index_of_clauses').text = 'Index of Clauses'
 
     etree.SubElement(body, 'h1').text = title
 
+    xml = join_references(xml, refs)
+    if snippets:
+        snippets.embed(xml)
+    # Sections are serialized separately (and possibly loaded from the
+    # cache), then spliced into the page in place of this comment.
+    body.append(etree.Comment(SECTIONS_PLACEHOLDER))
     sections = xml.find('sections')
-    for section in sections.findall('section'):
-        body.extend(section_as_elements(section, refs, base))
+    fragments = [section_as_html(section, base, cache) for section in sections.findall('section')]
     body.extend(index_clauses(xml))
-    body.tail = '\n'
-    root.append(body)
 
-    return b'<!DOCTYPE html>\n' + etree.tostring(root)
+    page = etree.tostring(root)
+    placeholder = etree.tostring(etree.Comment(SECTIONS_PLACEHOLDER))
+    before, after = page.split(placeholder, 1)
+    return b''.join([b'<!DOCTYPE html>\n', before] + fragments + [after])
+
+
+def section_heading(section):
+    name = section.get('name')
+    num = section.get('num')
+    if num and name:
+        return num + ' ' + name
+    return name or ''
+
+
+def section_page_name(section, index):
+    id = section.get('id')
+    if id:
+        return id + '.html'
+    return 'section{0}.html'.format(index)
+
+
+def relink(elements, pages, current):
+    """Point internal hyperlinks at the page containing their target."""
+    for elem in elements:
+        for a in elem.iter('a'):
+            href = a.get('href')
+            if not href or not href.startswith('#'):
+                continue
+            page = pages.get(href[1:])
+            if page and page != current:
+                a.set('href', page + href)
+
+
+def nav_as_element(links):
+    p = etree.Element('p')
+    p.set('class', 'nav')
+    for i, (href, text) in enumerate(links):
+        a = etree.SubElement(p, 'a', href=href)
+        a.text = text
+        if i + 1 < len(links):
+            a.tail = ' | '
+    p.tail = '\n'
+    return p
+
+
+class SplitRenderer:
+    """Renders the pages of a split document one at a time.
+
+    The references are joined once, so each page can then be rendered on
+    its own, as split_as_html does for all of them.
+    """
+    def __init__(self, xml, refs, base, index_name='index.html', snippets=None):
+        self.title = 'RFC {0}: {1}'.format(xml.attrib['number'], xml.attrib['title'])
+        self.xml = join_references(xml, refs)
+        if snippets:
+            snippets.embed(self.xml)
+        self.base = base
+        self.index_name = index_name
+        self.sections = self.xml.find('sections').findall('section')
+        self.names = [section_page_name(section, i + 1) for i, section in enumerate(self.sections)]
+        self.pages = {}
+        for section, name in zip(self.sections, self.names):
+            for elem in section.iter():
+                id = elem.get('id')
+                if id and elem.tag != 'coderef':
+                    self.pages.setdefault(id, name)
+
+    def index_html(self):
+        root, body = html_page(self.title)
+        etree.SubElement(body, 'h1').text = self.title
+        toc = etree.SubElement(body, 'ul')
+        toc.set('class', 'toc')
+        toc.text = '\n'
+        for section, name in zip(self.sections, self.names):
+            li = etree.SubElement(toc, 'li')
+            etree.SubElement(li, 'a', href=name).text = section_heading(section)
+            li.tail = '\n'
+        toc.tail = '\n\n'
+        index = index_clauses(self.xml)
+        relink(index, self.pages, self.index_name)
+        body.extend(index)
+        return b'<!DOCTYPE html>\n' + etree.tostring(root)
+
+    def section_html(self, i):
+        """Render the page of the i-th section."""
+        section = self.sections[i]
+        name = self.names[i]
+        root, body = html_page('{0} - {1}'.format(self.title, section_heading(section)))
+        links = [(self.index_name, 'Index')]
+        if i > 0:
+            links.append((self.names[i - 1], 'Previous'))
+        if i + 1 < len(self.sections):
+            links.append((self.names[i + 1], 'Next'))
+        body.append(nav_as_element(links))
+        elem = section_as_element(section, self.base)
+        relink([elem], self.pages, name)
+        body.append(elem)
+        body.append(nav_as_element(links))
+        return b'<!DOCTYPE html>\n' + etree.tostring(root)
+
+
+def split_as_html(xml, refs, base, index_name='index.html', snippets=None):
+    """Render one page per section plus a navigation index.
+
+    Returns a list of (filename, html) pairs, starting with the index.
+    """
+    renderer = SplitRenderer(xml, refs, base, index_name, snippets)
+    output = [(index_name, renderer.index_html())]
+    for i, name in enumerate(renderer.names):
+        output.append((name, renderer.section_html(i)))
+    return output
 
 
 class Reference:
+    __slots__ = ['type', 'doc', 'id', 'filename', 'linenum']
+
     def __init__(self, type, doc, id, filename, linenum):
         self.type = type
         self.doc = doc
@@ -289,13 +606,18 @@ class Reference:
         self.filename = filename
         self.linenum = linenum
 
-    def as_xml(self):
+    @property
+    def reftype(self):
+        """The type of reference, guessed from the filename if it wasn't given."""
         type = self.type
         if not type:
             type = 'impl'
             if self.filename.find('test') != -1:
                 type = 'test'
-        return etree.Element('coderef', type=type, path=self.filename, line=str(self.linenum))
+        return type
+
+    def as_xml(self):
+        return etree.Element('coderef', type=self.reftype, path=self.filename, line=str(self.linenum))
 
 
 def get_docid(elem):
@@ -304,17 +626,122 @@ def get_docid(elem):
     if rfc is not None and uri is None:
         docid = ('rfc', rfc.text)
     elif uri is not None and rfc is None:
-        docid = ('uri', uri)
+        docid = ('uri', uri.text)
     else:
         raise ParseException('<{0}> requires either <rfc> or <uri> but not both'.format(elem.tag))
     return docid
 
 
+# Compact references are stored one per line, as tab-separated fields:
+# type (or -), docid (e.g. rfc:6762), reqid, filename, linenum
+LINES_EXT = '.reql'
+LINES_HEADER = '# reqtrace references 1\n'
+LINES_SEPARATORS = re.compile(r'[\t\n\r]')
+
+
+def docid_as_text(docid):
+    return '{0}:{1}'.format(*docid)
+
+
+def docid_of_text(text):
+    return tuple(text.split(':', 1))
+
+
+# Tar archives of .req and .reql files are read without being extracted
+ARCHIVE_EXTS = ('.tar', '.tar.gz', '.tgz', '.tar.xz', '.tar.bz2')
+
+
+def is_archive_path(path):
+    return path.endswith(ARCHIVE_EXTS)
+
+
 class References:
     def __init__(self):
         self.references = {}
 
-    def load(self, path, filter_docid):
+    def load(self, path, filter_docid, data=None):
+        """Load a .req, .reql or archive file.
+
+        If data is given, it is the contents of the file, which is then
+        not read from path.
+        """
+        f = None if data is None else io.BytesIO(data)
+        if is_archive_path(path):
+            self.load_archive(path, filter_docid, f)
+        elif path.endswith(LINES_EXT):
+            if f is not None:
+                self.load_lines(io.TextIOWrapper(f, encoding='utf-8'), path, filter_docid)
+                return
+            with open(path, 'r', encoding='utf-8') as f:
+                self.load_lines(f, path, filter_docid)
+        else:
+            self.load_xml(f or path, filter_docid)
+
+    def load_archive(self, path, filter_docid, fileobj=None):
+        """Load the .req and .reql members of a tar archive, without extracting it."""
+        with tarfile.open(path, fileobj=fileobj) as tar:
+            members = {}
+            for member in tar:
+                if member.isfile() and (member.name.endswith('.req') or member.name.endswith(LINES_EXT)):
+                    members[member.name] = member
+            for name, member in members.items():
+                # As for directories, prefer the compact form unless it is older
+                if name.endswith('.req'):
+                    other = members.get(name + 'l')
+                    if other is not None and other.mtime >= member.mtime:
+                        continue
+                else:
+                    other = members.get(name[:-1])
+                    if other is not None and other.mtime > member.mtime:
+                        continue
+                display_name = '{0}:{1}'.format(path, name)
+                f = tar.extractfile(member)
+                if name.endswith(LINES_EXT):
+                    self.load_lines(io.TextIOWrapper(f, encoding='utf-8'), display_name, filter_docid)
+                else:
+                    self.load_xml(f, filter_docid)
+
+    def load_lines(self, f, path, filter_docid):
+        if filter_docid:
+            filter_text = docid_as_text(filter_docid)
+        docids = {}
+        references = self.references
+        for line in f:
+            if line.startswith('#'):
+                continue
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) != 5:
+                raise ParseException('Expected 5 tab-separated fields in {0}: {1!r}'.format(path, line))
+            reftype, docid_text, reqid, filename, linenum = fields
+            if filter_docid and docid_text != filter_text:
+                continue
+            docid = docids.get(docid_text)
+            if docid is None:
+                docid = docids[docid_text] = docid_of_text(docid_text)
+            if reftype == '-':
+                reftype = None
+            ref = Reference(reftype, docid, reqid, filename, int(linenum))
+            l = references.get(reqid)
+            if l is None:
+                l = references[reqid] = []
+            l.append(ref)
+
+    def save_lines(self, f):
+        """Write the references in the .reql format.
+
+        Fields can't contain tabs or line breaks, so a reference with one
+        in its reqid or filename raises ParseException.
+        """
+        f.write(LINES_HEADER)
+        for reqid, references in self.references.items():
+            for ref in references:
+                fields = [ref.type or '-', docid_as_text(ref.doc), reqid, ref.filename, str(ref.linenum)]
+                for field in fields:
+                    if LINES_SEPARATORS.search(field):
+                        raise ParseException('Cannot save {0!r} in {1}: tabs and line breaks are not allowed'.format(field, LINES_EXT))
+                f.write('\t'.join(fields) + '\n')
+
+    def load_xml(self, path, filter_docid):
         xml = etree.parse(path)
         root = xml.getroot()
         if root.tag != NS + 'unit':
@@ -346,38 +773,102 @@ class References:
             l = self.references.setdefault(reqid, [])
             l.append(ref)
 
+    def load_paths(self, paths, filter_docid):
+        """Load each file, or each .req or .reql file below each directory."""
+        for path in reference_files(paths):
+            self.load(path, filter_docid)
+
+
+def reference_files(paths):
+    """Yield each file, or each .req or .reql file below each directory.
+
+    Where a directory contains both forms of the same file, the
+    compact one is used unless it is older.
+    """
+    for ref_path in paths:
+        if os.path.isdir(ref_path):
+            for dirpath, dirnames, filenames in os.walk(ref_path):
+                names = set(filenames)
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    if filename.endswith('.req'):
+                        lines_name = filename + 'l'
+                        if lines_name in names and os.path.getmtime(os.path.join(dirpath, lines_name)) >= os.path.getmtime(path):
+                            continue
+                        yield path
+                    elif filename.endswith(LINES_EXT):
+                        xml_path = path[:-1]
+                        if filename[:-1] in names and os.path.getmtime(xml_path) > os.path.getmtime(path):
+                            continue
+                        yield path
+        else:
+            yield ref_path
+
 
 def main():
     import argparse
     parser = argparse.ArgumentParser(description='Convert an IETF RFC from annotated XML to XHTML')
-    parser.add_argument('input', metavar='rfcNNNN_notes.xml', nargs=1, type=str,
+    parser.add_argument('input', metavar='rfcNNNN_notes.xml', nargs='?', type=str,
             help='The path to the input XML document (.xml)')
+    parser.add_argument('--store', dest='store', type=str,
+            help='The path to a database created by tracestore.py, to render from instead of the input XML document')
+    parser.add_argument('--rfc', dest='rfc', type=int,
+            help='The number of the RFC to render from the --store database')
     parser.add_argument('--html', dest='output_html', nargs=1, type=str,
             help='The path to an HTML output file')
     parser.add_argument('--ref', dest='ref', nargs='+', type=str,
-            help='The path to one or more input XML files containing requirement references extracted from OCaml code')
+            help='The path to one or more input XML files containing requirement references extracted from OCaml code, directories or tar archives of them')
     parser.add_argument('--base', dest='base', default='', type=str,
             help='The base URL for hyperlinks to the source code')
+    parser.add_argument('--snippets', dest='snippets', type=int,
+            help='Embed this many lines of source code before and after each code reference')
+    parser.add_argument('--src', dest='src', default='.', type=str,
+            help='The root directory of the source code, for --snippets')
+    parser.add_argument('--cache', dest='cache', type=str,
+            help='The path to a directory for caching rendered sections between runs')
+    parser.add_argument('--split', dest='split', nargs=1, type=str,
+            help='The path to an output directory for one HTML page per section plus an index.html')
     args = parser.parse_args()
 
-    doc = etree.parse(args.input[0])
-    docid = ('rfc', doc.getroot().attrib['number'])
-
     refs = References()
+    if args.store:
+        import tracestore
+        if not args.rfc:
+            parser.error('--store requires --rfc')
+        store = tracestore.TraceStore(args.store)
+        root = store.notes_tree(args.rfc)
+        if root is None:
+            parser.error('RFC {0} is not in {1}'.format(args.rfc, args.store))
+        doc = etree.ElementTree(root)
+        docid = ('rfc', root.attrib['number'])
+        store.load_references(refs, docid)
+        store.close()
+    elif args.input:
+        doc = etree.parse(args.input)
+        docid = ('rfc', doc.getroot().attrib['number'])
+    else:
+        parser.error('either an input XML document or --store is required')
+
     if args.ref:
-        for ref_path in args.ref:
-            if os.path.isdir(ref_path):
-                for dirpath, dirnames, filenames in os.walk(ref_path):
-                    for filename in filenames:
-                        if filename.endswith('.req'):
-                            refs.load(os.path.join(dirpath, filename), docid)
-            else:
-                refs.load(ref_path, docid)
+        refs.load_paths(args.ref, docid)
+
+    snippets = None
+    if args.snippets is not None:
+        snippets = SourceSnippets(args.src, args.snippets)
 
     if args.output_html:
-        html = root_as_html(doc.getroot(), refs, args.base)
+        cache = None
+        if args.cache:
+            cache = SectionCache(args.cache)
+        html = root_as_html(doc.getroot(), refs, args.base, cache, snippets)
         with open(args.output_html[0], 'wb') as f:
             f.write(html)
+    if args.split:
+        out_dir = args.split[0]
+        os.makedirs(out_dir, exist_ok=True)
+        for name, html in split_as_html(doc.getroot(), refs, args.base, snippets=snippets):
+            with open(os.path.join(out_dir, name), 'wb') as f:
+                f.write(html)
 
 if __name__ == '__main__':
     main()
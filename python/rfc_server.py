@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+
+# An HTTP service rendering annotated RFCs as HTML on request.
+#
+# Parsed notes documents, references, renderers and whole pages are kept
+# in bounded LRU caches, so a request only parses the files that have
+# changed since they were last used, and only renders a page again when
+# its notes or references have changed. The service is a plain WSGI application, and can
+# be run by any WSGI server or by the standard library server in main().
+
+import collections
+import hashlib
+import os
+import os.path
+import re
+import socketserver
+import threading
+import xml.etree.ElementTree as etree
+from wsgiref.simple_server import WSGIServer, make_server
+
+from rfc_notes import References, SplitRenderer, reference_files, root_as_html
+
+
+STATIC_FILES = {
+        'rfc_notes.css': 'text/css; charset=utf-8',
+        'rfc_notes.js': 'application/javascript; charset=utf-8',
+        }
+
+FULL_PAGE = re.compile(r'^/rfc(\d+)\.html$')
+SPLIT_PAGE = re.compile(r'^/rfc(\d+)/([^/]*)$')
+
+# Every reference file is loaded for every document, so the cache of
+# reference files should be able to hold all of them.
+MAX_REF_FILES = 4096
+
+
+class LRUCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+class FileCache:
+    """Caches a value computed from the contents of each file.
+
+    An entry is reused while the size and modification time of the file
+    are unchanged. Otherwise the file is hashed again, and the value is
+    only recomputed if the hash differs.
+    """
+    def __init__(self, load, max_entries):
+        self.load = load
+        self.cache = LRUCache(max_entries)
+
+    def get(self, path):
+        """Return (sha1, value) for the current contents of path."""
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        entry = self.cache.get(path)
+        if entry and entry[0] == stamp:
+            return entry[1], entry[2]
+        with open(path, 'rb') as f:
+            data = f.read()
+        sha1 = hashlib.sha1(data).hexdigest()
+        if entry and entry[1] == sha1:
+            value = entry[2]
+        else:
+            value = self.load(path, data)
+        self.cache.put(path, (stamp, sha1, value))
+        return sha1, value
+
+
+def load_notes(path, data):
+    return etree.fromstring(data)
+
+
+def load_refs(path, data):
+    refs = References()
+    refs.load(path, None, data)
+    return refs
+
+
+def rfc_number(path):
+    """Return the RFC number of a notes document without parsing all of it."""
+    with open(path, 'rb') as f:
+        for event, elem in etree.iterparse(f, events=['start']):
+            return elem.get('number')
+
+
+class RenderService:
+    """A WSGI application serving the annotated RFCs in notes_paths.
+
+    /rfcNNNN.html is the whole document, /rfcNNNN/ is the index of a
+    split document and /rfcNNNN/<section>.html are its sections.
+    """
+    def __init__(self, notes_paths, ref_paths, base, max_entries=8, share_dir=None):
+        self.ref_paths = ref_paths
+        self.base = base
+        self.share_dir = share_dir or os.path.dirname(os.path.abspath(__file__))
+        self.documents = {}
+        for path in notes_paths:
+            if os.path.isdir(path):
+                for filename in sorted(os.listdir(path)):
+                    if filename.endswith('.xml'):
+                        self.add_document(os.path.join(path, filename))
+            else:
+                self.add_document(path)
+        self.notes = FileCache(load_notes, max_entries)
+        self.ref_files = FileCache(load_refs, MAX_REF_FILES)
+        self.refs = LRUCache(max_entries)
+        self.renderers = LRUCache(max_entries)
+        self.pages = LRUCache(max_entries)
+
+    def add_document(self, path):
+        try:
+            number = rfc_number(path)
+        except etree.ParseError:
+            return
+        if number:
+            self.documents[number] = path
+
+    def references(self, docid):
+        """Return (key, references to docid), where the key identifies the contents of the files."""
+        loaded = [(path,) + self.ref_files.get(path) for path in reference_files(self.ref_paths)]
+        key = tuple((path, sha1) for path, sha1, file_refs in loaded)
+        entry = self.refs.get(docid)
+        if entry and entry[0] == key:
+            return entry
+        refs = References()
+        for path, sha1, file_refs in loaded:
+            for reqid, references in file_refs.references.items():
+                matching = [ref for ref in references if ref.doc == docid]
+                if matching:
+                    refs.references.setdefault(reqid, []).extend(matching)
+        entry = (key, refs)
+        self.refs.put(docid, entry)
+        return entry
+
+    def document(self, number):
+        """Return (key, notes root, references) for an RFC, or None if it is unknown."""
+        path = self.documents.get(number)
+        if path is None:
+            return None
+        sha1, root = self.notes.get(path)
+        refs_key, refs = self.references(('rfc', number))
+        return (sha1, refs_key), root, refs
+
+    def render_page(self, number):
+        document = self.document(number)
+        if document is None:
+            return None
+        key, root, refs = document
+        entry = self.pages.get(number)
+        if entry and entry[0] == key:
+            return entry[1]
+        html = root_as_html(root, refs, self.base)
+        self.pages.put(number, (key, html))
+        return html
+
+    def render_split(self, number, name):
+        document = self.document(number)
+        if document is None:
+            return None
+        key, root, refs = document
+        entry = self.renderers.get(number)
+        if entry and entry[0] == key:
+            renderer = entry[1]
+        else:
+            renderer = SplitRenderer(root, refs, self.base)
+            self.renderers.put(number, (key, renderer))
+        if name in ('', renderer.index_name):
+            return renderer.index_html()
+        try:
+            i = renderer.names.index(name)
+        except ValueError:
+            return None
+        return renderer.section_html(i)
+
+    def render_list(self):
+        lines = ['<!DOCTYPE html>', '<html xmlns="http://www.w3.org/1999/xhtml">',
+                '<head><title>Annotated RFCs</title></head>', '<body>', '<ul>']
+        for number in sorted(self.documents, key=int):
+            lines.append('<li><a href="rfc{0}.html">RFC {0}</a> (<a href="rfc{0}/">by section</a>)</li>'.format(number))
+        lines.extend(['</ul>', '</body>', '</html>', ''])
+        return '\n'.join(lines).encode('utf-8')
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO') or '/'
+        content_type = 'text/html; charset=utf-8'
+        body = None
+        name = path.rsplit('/', 1)[-1]
+        if path == '/':
+            body = self.render_list()
+        elif name in STATIC_FILES:
+            content_type = STATIC_FILES[name]
+            try:
+                with open(os.path.join(self.share_dir, name), 'rb') as f:
+                    body = f.read()
+            except OSError:
+                pass
+        else:
+            match = FULL_PAGE.match(path)
+            if match:
+                body = self.render_page(match.group(1))
+            else:
+                match = SPLIT_PAGE.match(path)
+                if match:
+                    body = self.render_split(match.group(1), match.group(2))
+        if body is None:
+            start_response('404 Not Found', [('Content-Type', 'text/plain; charset=utf-8')])
+            return [b'Not found\n']
+        start_response('200 OK', [('Content-Type', content_type), ('Content-Length', str(len(body)))])
+        return [body]
+
+
+class ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Serve annotated IETF RFCs as XHTML, rendering them on request')
+    parser.add_argument('input', metavar='rfcNNNN_notes.xml', nargs='+', type=str,
+            help='The paths to the annotated XML documents (.xml), or directories containing them')
+    parser.add_argument('--ref', dest='ref', nargs='+', default=[], type=str,
+            help='The path to one or more input XML files containing requirement references extracted from OCaml code')
+    parser.add_argument('--base', dest='base', default='', type=str,
+            help='The base URL for hyperlinks to the source code')
+    parser.add_argument('--host', dest='host', default='localhost', type=str,
+            help='The address to listen on')
+    parser.add_argument('--port', dest='port', default=8000, type=int,
+            help='The port to listen on')
+    parser.add_argument('--max-entries', dest='max_entries', default=8, type=int,
+            help='The number of documents to keep parsed in memory')
+    args = parser.parse_args()
+
+    service = RenderService(args.input, args.ref, args.base, args.max_entries)
+    server = make_server(args.host, args.port, service, server_class=ThreadingWSGIServer)
+    print('Serving {0} documents on http://{1}:{2}/'.format(len(service.documents), args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
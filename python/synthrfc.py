@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+# Generates synthetic IETF RFCs of any size, together with matching
+# annotated XML and .req reference files, for testing how the tools
+# scale with the size of their input.
+
+import os
+import os.path
+import random
+import re
+import xml.etree.ElementTree as etree
+
+import parseietf
+from rfc_notes import NS
+
+
+LINE_WIDTH = 72
+BODY_LINES_PER_PAGE = 48
+
+WORDS = '''
+    address answer cache client configuration data domain host interface
+    link message name network packet protocol query record request
+    resolver response record server service time transmission value
+'''.split()
+KEYWORDS = ['MUST', 'MUST NOT', 'SHOULD', 'SHOULD NOT', 'MAY', 'REQUIRED', 'OPTIONAL']
+# Abbreviations that must not be treated as the end of a clause
+ABBREVIATIONS = ['e.g.,', 'i.e.,', 'L. Dunstan', 'S. Cheshire', '(e.g., a host)']
+
+
+class Generator:
+    def __init__(self, scale, number=9999, seed=0):
+        self.scale = scale
+        self.number = number
+        self.rng = random.Random(seed)
+        self.title = 'Synthetic Protocol Specification'
+        self.category = 'Standards Track'
+        self.date = 'January 2015'
+        self.lines = []
+        self.body_lines = 0
+        self.page = 1
+
+    def sentence(self):
+        rng = self.rng
+        words = [rng.choice(WORDS) for i in range(rng.randint(8, 20))]
+        words[0] = words[0].capitalize()
+        if rng.random() < 0.5:
+            words.insert(rng.randint(2, len(words) - 1), rng.choice(KEYWORDS))
+        if rng.random() < 0.3:
+            words.insert(rng.randint(2, len(words) - 1), rng.choice(ABBREVIATIONS))
+        if rng.random() < 0.1:
+            words.extend(['as', 'described', 'in', 'Appendix', 'A'])
+        return ' '.join(words) + '.'
+
+    def header_line(self):
+        left = 'RFC {0}'.format(self.number)
+        return self.three_columns(left, self.title, self.date)
+
+    def footer_line(self):
+        right = '[Page {0}]'.format(self.page)
+        return self.three_columns('Author', self.category, right)
+
+    def three_columns(self, left, centre, right):
+        gap = LINE_WIDTH - len(left) - len(centre) - len(right)
+        line = left + ' ' * (gap // 2) + centre + ' ' * (gap - gap // 2) + right
+        assert len(line) == LINE_WIDTH
+        return line
+
+    def emit(self, line):
+        if self.body_lines == BODY_LINES_PER_PAGE:
+            self.lines.extend(['', '', self.footer_line(), '\x0c', self.header_line(), '', ''])
+            self.page += 1
+            self.body_lines = 0
+        self.lines.append(line)
+        self.body_lines += 1
+
+    def paragraph(self, sentences):
+        text = '  '.join(self.sentence() for i in range(sentences))
+        line = ''
+        # Keep the two spaces after each sentence unless the line is wrapped
+        for match in re.finditer(r'(\S+)( *)', text):
+            word, space = match.groups()
+            if line and len(line) + len(word) > LINE_WIDTH - 3:
+                self.emit('   ' + line.rstrip())
+                line = ''
+            line += word + space
+        self.emit('   ' + line.rstrip())
+        self.emit('')
+
+    def section(self, heading, paragraphs):
+        self.emit(heading)
+        self.emit('')
+        for i in range(paragraphs):
+            self.paragraph(self.rng.randint(1, 8))
+
+    def generate(self):
+        """Return the text of the RFC."""
+        self.lines = []
+        self.emit('')
+        self.emit(self.three_columns('Internet Engineering Task Force (IETF)', '', 'L. Dunstan'))
+        self.emit('Request for Comments: {0}'.format(self.number).ljust(LINE_WIDTH - len('Example')) + 'Example')
+        self.emit('Category: {0}'.format(self.category).ljust(LINE_WIDTH - len(self.date)) + self.date)
+        self.emit('ISSN: 2070-1721')
+        self.emit('')
+        self.emit('')
+        self.emit(self.title.center(LINE_WIDTH).rstrip())
+        self.emit('')
+        self.section('Abstract', 1)
+        self.section('Status of This Memo', 2)
+        for num in range(1, 10 * self.scale + 1):
+            self.section('{0}.  {1}'.format(num, self.rng.choice(WORDS).capitalize()), 2)
+            for sub in range(1, self.rng.randint(1, 3) + 1):
+                self.section('{0}.{1}.  {2}'.format(num, sub, self.rng.choice(WORDS).capitalize()), 2)
+        for app in 'AB':
+            self.section('Appendix {0}.  {1}'.format(app, self.rng.choice(WORDS).capitalize()), 2)
+        # Pad the last page and finish it with a footer
+        while self.body_lines < BODY_LINES_PER_PAGE:
+            self.lines.append('')
+            self.body_lines += 1
+        self.lines.append(self.footer_line())
+        return '\n'.join(self.lines) + '\n'
+
+
+def generate_notes(doc, rng, fraction=0.2):
+    """Return annotated XML for doc, with notes on a fraction of the clauses."""
+    xml = doc.as_xml()
+    for clause in xml.getroot().iter('clause'):
+        if rng.random() < fraction:
+            notes = etree.SubElement(clause, 'notes')
+            notes.text = '\n'
+            note = etree.SubElement(notes, 'note')
+            note.text = 'Implementation note.'
+            note.tail = '\n'
+            if rng.random() < 0.3:
+                note.set('type', 'todo')
+            notes.tail = '\n'
+    return xml
+
+
+def generate_refs(doc, rng, num_files, refs_per_file):
+    """Return a list of (source path, .req XML tree) pairs referring to doc."""
+    reqids = [obj.id for depth, obj in doc.elements() if depth == 2]
+    result = []
+    for i in range(num_files):
+        path = 'src/file{0}.ml'.format(i)
+        root = etree.Element(NS + 'unit')
+        specdoc = etree.SubElement(root, NS + 'specdoc', name='spec')
+        etree.SubElement(specdoc, NS + 'rfc').text = str(doc.rfc_number)
+        for j in range(refs_per_file):
+            reqref = etree.SubElement(root, NS + 'reqref')
+            if j % 3 == 0:
+                reqref.set('type', 'test')
+            etree.SubElement(reqref, NS + 'docref', name='spec')
+            etree.SubElement(reqref, NS + 'reqid').text = rng.choice(reqids)
+            etree.SubElement(reqref, NS + 'loc', filename=path, linenum=str(j + 1))
+        result.append((path, etree.ElementTree(root)))
+    return result
+
+
+def write_corpus(out_dir, scale, number=9999, seed=0, num_files=None, refs_per_file=50):
+    """Write rfcNNNN.txt, rfcNNNN_notes.xml and a directory of .req files."""
+    rng = random.Random(seed)
+    text = Generator(scale, number, seed).generate()
+    os.makedirs(os.path.join(out_dir, 'refs'), exist_ok=True)
+    txt_path = os.path.join(out_dir, 'rfc{0}.txt'.format(number))
+    with open(txt_path, 'w') as f:
+        f.write(text)
+    doc = parseietf.parse_path(txt_path)
+    generate_notes(doc, rng).write(os.path.join(out_dir, 'rfc{0}_notes.xml'.format(number)))
+    if num_files is None:
+        num_files = scale
+    for path, tree in generate_refs(doc, rng, num_files, refs_per_file):
+        name = os.path.splitext(os.path.basename(path))[0] + '.req'
+        tree.write(os.path.join(out_dir, 'refs', name))
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Generate a synthetic IETF RFC with annotated XML and references, for scalability testing')
+    parser.add_argument('out_dir', type=str,
+            help='The directory in which to write the generated files')
+    parser.add_argument('--scale', dest='scale', default=1, type=int,
+            help='The size of the document, in multiples of ten sections')
+    parser.add_argument('--number', dest='number', default=9999, type=int,
+            help='The RFC number of the generated document')
+    parser.add_argument('--seed', dest='seed', default=0, type=int,
+            help='The seed for the random number generator')
+    args = parser.parse_args()
+    write_corpus(args.out_dir, args.scale, args.number, args.seed)
+
+if __name__ == '__main__':
+    main()
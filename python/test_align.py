@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import copy
+import unittest
+import xml.etree.ElementTree as etree
+import align
+import parseietf
+
+
+CLAUSES = [
+        'A querier MUST send its first query after a random delay of 20 to 120 ms.',
+        'Responders SHOULD cache records for the duration of their TTL before discarding them.',
+        'Implementations MAY suppress duplicate answers that another responder has already sent.',
+        ]
+
+
+def document(sections, fingerprints=True):
+    """Build an annotated document from a list of sections, each a list of paragraphs of clause texts."""
+    root = etree.Element('rfc', number='9999')
+    sections_elem = etree.SubElement(root, 'sections')
+    for s, paragraphs in enumerate(sections, 1):
+        section = etree.SubElement(sections_elem, 'section', num=str(s), id='s{0}'.format(s), name='Section {0}'.format(s))
+        for p, clauses in enumerate(paragraphs, 1):
+            paragraph_id = 's{0}_p{1}'.format(s, p)
+            paragraph = etree.SubElement(section, 'paragraph', num=str(p), id=paragraph_id)
+            if fingerprints:
+                paragraph.set('fingerprint', parseietf.fingerprint(' '.join(clauses)))
+            for c, text in enumerate(clauses, 1):
+                clause = etree.SubElement(paragraph, 'clause', id='{0}_c{1}'.format(paragraph_id, c), num=str(c))
+                if fingerprints:
+                    clause.set('fingerprint', parseietf.fingerprint(text))
+                etree.SubElement(clause, 'linesub', start='0', end='0').text = text
+    return root
+
+
+def add_note(root, id, text):
+    elem = [elem for elem in root.iter() if elem.get('id') == id][0]
+    notes = etree.SubElement(elem, 'notes')
+    etree.SubElement(notes, 'note').text = text
+    return notes
+
+
+def notes_by_id(root):
+    return {elem.get('id'): [note.text for note in elem.iter('note')]
+            for elem in root.iter() if elem.find('notes') is not None}
+
+
+class TestCarryNotes(unittest.TestCase):
+    def setUp(self):
+        self.old = document([[CLAUSES]])
+        add_note(self.old, 's1_p1_c2', 'cache')
+        etree.SubElement(add_note(self.old, 's1_p1_c3', 'suppress'), 'ref', target='s1_p1_c2')
+
+    def test_identity(self):
+        new = document([[CLAUSES]])
+        id_map, orphans = align.carry_notes(self.old, new)
+        self.assertEqual([], orphans)
+        self.assertEqual('s1_p1_c2', id_map['s1_p1_c2'])
+        self.assertEqual(notes_by_id(self.old), notes_by_id(new))
+
+    def test_moved(self):
+        new = document([[CLAUSES[:1]], [CLAUSES[2:], CLAUSES[1:2]]])
+        id_map, orphans = align.carry_notes(self.old, new)
+        self.assertEqual([], orphans)
+        self.assertEqual({'s2_p2_c1': ['cache'], 's2_p1_c1': ['suppress']}, notes_by_id(new))
+        self.assertEqual(['s2_p2_c1'], [ref.get('target') for ref in new.iter('ref')])
+
+    def test_edited(self):
+        edited = CLAUSES[1].replace('before discarding them', 'before they are discarded')
+        new = document([[[CLAUSES[0], edited, CLAUSES[2]]]])
+        id_map, orphans = align.carry_notes(self.old, new)
+        self.assertEqual([], orphans)
+        self.assertEqual(['cache'], notes_by_id(new)['s1_p1_c2'])
+
+    def test_deleted(self):
+        new = document([[CLAUSES[:2]]])
+        id_map, orphans = align.carry_notes(self.old, new)
+        self.assertEqual(['s1_p1_c3'], orphans)
+        self.assertNotIn('s1_p1_c3', id_map)
+        self.assertEqual({'s1_p1_c2': ['cache']}, notes_by_id(new))
+
+    def test_without_stored_fingerprints(self):
+        # Documents written before the fingerprint attribute was added
+        old = document([[CLAUSES]], fingerprints=False)
+        add_note(old, 's1_p1', 'paragraph')
+        new = document([[CLAUSES[2:]], [CLAUSES]])
+        id_map, orphans = align.carry_notes(old, new)
+        self.assertEqual({'s2_p1': ['paragraph']}, notes_by_id(new))
+
+    def test_stored_fingerprints_used(self):
+        old = document([[CLAUSES]])
+        new = copy.deepcopy(old)
+        # Only the fingerprint says these are the same clause
+        for elem in new.iter('linesub'):
+            elem.text = elem.text.upper()
+        add_note(old, 's1_p1_c1', 'query')
+        align.carry_notes(old, new)
+        self.assertEqual({'s1_p1_c1': ['query']}, notes_by_id(new))
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
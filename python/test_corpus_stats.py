@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+import io
+import unittest
+import corpus_stats
+import parseietf
+
+
+class TestClauseTable(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.docs = [parseietf.parse_path('rfc6762.txt'), parseietf.parse_path('rfc2671.txt')]
+        cls.table = corpus_stats.ClauseTable()
+        for doc in cls.docs:
+            cls.table.add_document(doc)
+
+    def test_by_rfc(self):
+        stats = corpus_stats.Statistics(self.table)
+        for doc, (rfc, counts, total) in zip(sorted(self.docs, key=lambda doc: doc.rfc_number), stats.by_rfc()):
+            clauses = [obj for depth, obj in doc.elements() if depth == 2]
+            self.assertEqual(doc.rfc_number, rfc)
+            self.assertEqual(len(clauses), total)
+            self.assertEqual([len([clause for clause in clauses if clause.importance == importance])
+                for importance in ['must', 'should', 'may']], counts)
+
+    def test_by_section(self):
+        stats = corpus_stats.Statistics(self.table)
+        sections = {(rfc, id): counts for rfc, id, name, counts in stats.by_section()}
+        section = self.docs[0].sections[[section.id for section in self.docs[0].sections].index('s6')]
+        musts = [clause for paragraph in section.paragraphs for clause in paragraph.clauses if clause.importance == 'must']
+        self.assertEqual(len(musts), sections[(6762, 's6')][0])
+        self.assertEqual(sum(self.table.length), sum(length for rfc, id, name, length in stats.longest_sections(len(self.table.sections))))
+
+    def test_save_load(self):
+        f = io.BytesIO()
+        self.table.save(f)
+        f.seek(0)
+        loaded = corpus_stats.ClauseTable.load(f)
+        self.assertEqual(self.table.sections, loaded.sections)
+        for name, typecode in corpus_stats.COLUMNS:
+            self.assertEqual(getattr(self.table, name), getattr(loaded, name))
+
+    def test_no_rfc_number(self):
+        doc = parseietf.parse_path('rfc2671.txt')
+        doc.rfc_number = None
+        table = corpus_stats.ClauseTable()
+        self.assertFalse(table.add_document(doc))
+        self.assertEqual(0, len(table))
+
+    def test_group_sum(self):
+        self.assertEqual({1: 5, 2: 3}, dict(corpus_stats.group_sum([1, 2, 1], [2, 3, 3])))
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
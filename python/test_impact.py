@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+import unittest
+import impact
+import refindex
+from testutil import references
+
+
+DIFF = """--- a/src/mdns.ml
++++ b/src/mdns.ml
+@@ -1,6 +1,6 @@
+ let a = 1
+ let b = 2
+-let c = 3
+ let d = 4
+ let e = 5
++let x = 0
+ let f = 6
+"""
+
+
+class TestImpact(unittest.TestCase):
+    def test_diff_ranges(self):
+        self.assertEqual({'src/mdns.ml': [(3, 3), (5, 6)]}, impact.diff_ranges(DIFF.splitlines(True)))
+
+    def test_affected(self):
+        refs = references([('s3_p4_c1', 'src/mdns.ml', 3), ('s6_p1', 'src/mdns.ml', 4), ('s6', 'src/mdns.ml', 6)])
+        index = refindex.LocationIndex.from_references(refs)
+        result = impact.affected(index, impact.diff_ranges(DIFF.splitlines(True)))
+        self.assertEqual(['s3_p4_c1', 's6'], sorted(reqid for docid, reqid in result))
+
+    def test_deletions(self):
+        diff = """--- a/src/mdns.ml
++++ b/src/mdns.ml
+@@ -4,2 +3,0 @@
+-let d = 4
+-let e = 5
+--- a/src/old.ml
++++ /dev/null
+@@ -1,2 +0,0 @@
+-let a = 1
+-let b = 2
+--- /dev/null
++++ b/src/new.ml
+@@ -0,0 +1 @@
++let a = 1
+"""
+        self.assertEqual({'src/mdns.ml': [(4, 4), (5, 5)], 'src/old.ml': [(1, 1), (2, 2)]},
+                impact.diff_ranges(diff.splitlines(True)))
+
+    def test_end_of_file(self):
+        diff = """--- a/src/mdns.ml
++++ b/src/mdns.ml
+@@ -6,0 +7,2 @@
++let g = 7
++let h = 8
+--- a/src/other.ml
++++ b/src/other.ml
+@@ -2 +2 @@
+-let b = 2
+\\ No newline at end of file
++let b = 3
+\\ No newline at end of file
+"""
+        self.assertEqual({'src/mdns.ml': [(6, 7), (6, 7)], 'src/other.ml': [(2, 2), (2, 3)]},
+                impact.diff_ranges(diff.splitlines(True)))
+
+    def test_renamed(self):
+        # References are to the old name, which the ranges are reported under
+        diff = """diff --git a/src/old.ml b/src/new.ml
+similarity index 90%
+rename from src/old.ml
+rename to src/new.ml
+--- a/src/old.ml
++++ b/src/new.ml
+@@ -2 +2 @@
+-let b = 2
++let b = 3
+diff --git a/src/moved.ml b/src/moved2.ml
+similarity index 100%
+rename from src/moved.ml
+rename to src/moved2.ml
+"""
+        self.assertEqual({'src/old.ml': [(2, 2), (2, 3)]}, impact.diff_ranges(diff.splitlines(True)))
+
+    def test_merge_ranges(self):
+        # Overlapping and adjacent ranges are merged, in any order
+        self.assertEqual([[1, 6]], impact.merge_ranges([(5, 6), (1, 3), (4, 4), (2, 5)]))
+        self.assertEqual([[1, 2], [4, 4]], impact.merge_ranges([(4, 4), (1, 2)]))
+        self.assertEqual([[1, 5]], impact.merge_ranges([(4, 4), (1, 1)], context=1))
+        self.assertEqual([[3, 3]], impact.merge_ranges([(3, 3), (3, 3)]))
+
+    def test_affected_adjacent(self):
+        refs = references([('s1', 'src/mdns.ml', 2), ('s2', 'src/mdns.ml', 3), ('s3', 'src/mdns.ml', 5)])
+        index = refindex.LocationIndex.from_references(refs)
+        result = impact.affected(index, {'src/mdns.ml': [(3, 3), (1, 2), (2, 3)]})
+        self.assertEqual(['s1', 's2'], sorted(reqid for docid, reqid in result))
+        # Each location is only reported once where ranges overlap
+        self.assertEqual([1, 1], [len(locs) for locs in result.values()])
+        result = impact.affected(index, {'src/mdns.ml': [(3, 3)]}, context=2)
+        self.assertEqual(['s1', 's2', 's3'], sorted(reqid for docid, reqid in result))
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
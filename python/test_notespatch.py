@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+import os
+import os.path
+import tempfile
+import unittest
+import xml.etree.ElementTree as etree
+import notespatch
+
+
+NOTES = b'''<rfc number="9999">
+<sections>
+<section num="1" id="s1" name="Introduction">
+<paragraph num="1" id="s1_p1">
+<clause id="s1_p1_c1" num="1">
+<linesub start="0" end="10">First.</linesub>
+</clause>
+<clause id="s1_p1_c2" num="2">
+<linesub start="10" end="20">Second.</linesub>
+<notes><note>old</note></notes></clause>
+</paragraph>
+
+</section>
+</sections>
+</rfc>
+'''
+
+
+def note(text):
+    elem = etree.Element('note')
+    elem.text = text
+    return elem
+
+
+class TestNotesFile(unittest.TestCase):
+    def test_add_notes(self):
+        doc = notespatch.NotesFile(NOTES)
+        doc.add_to_notes('s1_p1_c1', note('new'))
+        self.assertEqual(NOTES.replace(b'First.</linesub>\n', b'First.</linesub>\n<notes>\n<note>new</note>\n</notes>\n'),
+                bytes(doc.data))
+        start, end = doc.span('s1_p1_c2')
+        self.assertEqual('s1_p1_c2', etree.fromstring(bytes(doc.data[start:end])).get('id'))
+
+    def test_replace_notes(self):
+        doc = notespatch.NotesFile(NOTES)
+        notes = etree.Element('notes')
+        notes.append(note('replaced'))
+        doc.replace_notes('s1_p1_c2', notes)
+        doc.add_to_notes('s1_p1_c2', note('added'))
+        self.assertEqual(['replaced', 'added'], [elem.text for elem in doc.get_notes('s1_p1_c2')])
+        start, end = doc.span('s1')
+        self.assertTrue(bytes(doc.data[start:end]).endswith(b'</section>'))
+
+    def test_empty_notes(self):
+        data = NOTES.replace(b'First.</linesub>\n', b'First.</linesub>\n<notes status="draft"/>')
+        doc = notespatch.NotesFile(data)
+        self.assertEqual(0, len(doc.get_notes('s1_p1_c1')))
+        doc.add_to_notes('s1_p1_c1', note('new'))
+        notes = doc.get_notes('s1_p1_c1')
+        self.assertEqual('draft', notes.get('status'))
+        self.assertEqual(['new'], [elem.text for elem in notes])
+        doc.add_to_notes('s1_p1_c1', note('more'))
+        self.assertEqual(['new', 'more'], [elem.text for elem in doc.get_notes('s1_p1_c1')])
+        self.assertEqual(['old'], [elem.text for elem in doc.get_notes('s1_p1_c2')])
+
+    def test_section_notes(self):
+        doc = notespatch.NotesFile(NOTES)
+        doc.add_to_notes('s1', note('section'))
+        root = etree.fromstring(bytes(doc.data))
+        self.assertEqual(['section'], [elem.text for elem in root.find('sections/section/notes')])
+        # The notes of the clauses inside the section are unaffected
+        self.assertEqual(['old'], [elem.text for elem in doc.get_notes('s1_p1_c2')])
+        doc.add_to_notes('s1_p1_c1', note('clause'))
+        self.assertEqual(['section'], [elem.text for elem in doc.get_notes('s1')])
+        start, end = doc.span('s1')
+        self.assertTrue(bytes(doc.data[start:end]).endswith(b'</notes>\n</section>'))
+
+    def test_save(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'rfc9999_notes.xml')
+            with open(path, 'wb') as f:
+                f.write(NOTES)
+            doc = notespatch.NotesFile.open(path)
+            # Nothing is written without changes
+            os.utime(path, (1000, 1000))
+            doc.save(path)
+            self.assertEqual(1000, os.stat(path).st_mtime)
+            doc.add_to_notes('s1_p1_c2', note('added'))
+            doc.replace_notes('s1_p1_c1', etree.fromstring('<notes><note>short</note></notes>'))
+            doc.save(path)
+            with open(path, 'rb') as f:
+                self.assertEqual(bytes(doc.data), f.read())
+            # Notes that shrink the file truncate it
+            doc.replace_notes('s1_p1_c2', etree.Element('notes'))
+            doc.save(path)
+            reopened = notespatch.NotesFile.open(path)
+            self.assertEqual(bytes(doc.data), bytes(reopened.data))
+            self.assertEqual(['short'], [elem.text for elem in reopened.get_notes('s1_p1_c1')])
+            self.assertEqual(0, len(reopened.get_notes('s1_p1_c2')))
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,12 @@
 #!/usr/bin/env python3
 
+import gzip
+import io
+import json
+import os.path
+import tempfile
 import unittest
+import xml.etree.ElementTree as etree
 import parseietf
 
 
@@ -66,6 +72,80 @@ class TestParse(unittest.TestCase):
         self.assertEqual('Other benefits of sending responses via multicast are discussed in Appendix D.', paragraph.clauses[1].text)
         self.assertEqual('A Multicast DNS querier MUST only accept unicast responses if they answer a recently sent query (e.g., sent within the last two seconds) that explicitly requested unicast responses.', paragraph.clauses[2].text)
 
+    def test_lazy(self):
+        doc = parseietf.parse_path('rfc6762.txt')
+        lazy = parseietf.parse_path('rfc6762.txt', lazy=True)
+        self.assertEqual(doc.title, lazy.title)
+        self.assertEqual([section.heading for section in doc.sections],
+                [section.heading for section in lazy.sections])
+        self.assertIsNone(lazy.sections[14]._paragraphs)
+        self.assertEqual(doc.sections[14].paragraphs[13].clauses[2].text,
+                lazy.sections[14].paragraphs[13].clauses[2].text)
+        self.assertEqual(etree.tostring(doc.as_xml().getroot()), etree.tostring(lazy.as_xml().getroot()))
+
+    def test_reqif(self):
+        doc = parseietf.parse_path('rfc6762.txt')
+        f = io.BytesIO()
+        doc.as_reqif(f, last_change='2015-01-01T00:00:00Z')
+        root = etree.fromstring(f.getvalue())
+        ns = '{' + parseietf.REQIF_NS + '}'
+        objects = root.findall('.//{0}SPEC-OBJECTS/{0}SPEC-OBJECT'.format(ns))
+        self.assertEqual(len(list(doc.elements())), len(objects))
+        self.assertEqual('rfc6762-s3_p4_c1', objects[[obj.get('LONG-NAME') for obj in objects].index('s3_p4_c1')].get('IDENTIFIER'))
+        spec = root.find('.//{0}SPECIFICATION'.format(ns))
+        sections = spec.findall('{0}CHILDREN/{0}SPEC-HIERARCHY'.format(ns))
+        self.assertEqual(len(doc.sections), len(sections))
+
+    def test_emitter(self):
+        doc = parseietf.parse_path('rfc6762.txt')
+        xml = io.BytesIO()
+        html = io.BytesIO()
+        reqif = io.BytesIO()
+        lazy = parseietf.parse_path('rfc6762.txt', lazy=True)
+        parseietf.Emitter([parseietf.XmlSink(xml), parseietf.HtmlSink(html),
+            parseietf.ReqifSink(reqif, last_change='2015-01-01T00:00:00Z')], release=True).emit(lazy)
+        self.assertEqual(etree.tostring(doc.as_xml().getroot()), xml.getvalue())
+        self.assertEqual(doc.as_html(), html.getvalue())
+        expected = io.BytesIO()
+        doc.as_reqif(expected, last_change='2015-01-01T00:00:00Z')
+        self.assertEqual(expected.getvalue(), reqif.getvalue())
+        self.assertTrue(all(section._paragraphs is None for section in lazy.sections))
+
+    def test_jsonl(self):
+        doc = parseietf.parse_path('rfc6762.txt', lazy=True)
+        f = io.BytesIO()
+        parseietf.Emitter([parseietf.JsonLinesSink(f)], release=True).emit(doc)
+        records = [json.loads(line) for line in f.getvalue().splitlines()]
+        clauses = [obj for depth, obj in doc.elements() if depth == 2]
+        self.assertEqual(len(clauses), len(records))
+        record = [record for record in records if record['clause'] == 's3_p4_c1'][0]
+        self.assertEqual((6762, 's3', 's3_p4'), (record['rfc'], record['section'], record['paragraph']))
+        single_line = 0
+        for clause, record in zip(clauses, records):
+            self.assertEqual(clause.id, record['clause'])
+            self.assertEqual(clause.text, record['text'])
+            first = clause.substrings[0]
+            last = clause.substrings[-1]
+            self.assertEqual(first.line.start + first.relative_start, record['start'])
+            self.assertEqual(last.line.start + last.relative_end, record['end'])
+            self.assertEqual(first.text, doc.text[record['start']:record['start'] + first.len])
+            self.assertEqual(last.text, doc.text[record['end'] - last.len:record['end']])
+            if len(clause.substrings) == 1:
+                self.assertEqual(first.text, record['text'])
+                self.assertEqual(record['text'], doc.text[record['start']:record['end']])
+                single_line += 1
+        self.assertGreater(single_line, 0)
+
+    def test_compressed(self):
+        doc = parseietf.parse_path('rfc6762.txt')
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'rfc6762.txt.gz')
+            with open('rfc6762.txt', 'rb') as f, gzip.open(path, 'wb') as out:
+                out.write(f.read())
+            compressed = parseietf.parse_path(path)
+        self.assertEqual(doc.sha1, compressed.sha1)
+        self.assertEqual(etree.tostring(doc.as_xml().getroot()), etree.tostring(compressed.as_xml().getroot()))
+
 
 def main():
     unittest.main()
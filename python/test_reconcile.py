@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+import os.path
+import tempfile
+import unittest
+import xml.etree.ElementTree as etree
+import reconcile
+
+
+def hashes(text):
+    return [reconcile.line_hash(line) for line in text.splitlines()]
+
+
+class TestMapLines(unittest.TestCase):
+    def test_inserted_lines(self):
+        old = hashes('let a = 1\nlet b = 2\nlet c = 3\n')
+        new = hashes('(* header *)\n\nlet a = 1\nlet b = 2\nlet x = 0\nlet c = 3\n')
+        self.assertEqual({1: 3, 2: 4, 3: 6}, reconcile.map_lines(old, new))
+
+    def test_changed_and_moved_lines(self):
+        old = hashes('let a = 1\nlet b = 2\nlet c = 3\nlet d = 4\n')
+        new = hashes('let d = 4\nlet a = 1\nlet b = 22\nlet c = 3\n')
+        mapping = reconcile.map_lines(old, new)
+        self.assertEqual(2, mapping[1])
+        self.assertNotIn(2, mapping)
+        self.assertEqual(4, mapping[3])
+        self.assertEqual(1, mapping[4])
+
+    def test_ref_attributes_ignored(self):
+        self.assertEqual(reconcile.line_hash('let a = 1\n'),
+                reconcile.line_hash('  let a = 1 [@ref rfc "s6_p1_c2"]\n'))
+
+
+class TestReconcile(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.src = self.tmp.name
+        self.write('let a = 1\nlet b = 2\nlet c = 3\n')
+        self.xml = etree.fromstring('<rfc><notes>'
+                '<coderef path="mdns.ml" line="2"/><coderef path="mdns.ml" line="3"/>'
+                '<coderef path="other.ml" line="1"/></notes></rfc>')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, text, name='mdns.ml'):
+        with open(os.path.join(self.src, name), 'w') as f:
+            f.write(text)
+
+    def lines(self):
+        return [coderef.get('line') for coderef in self.xml.iter('coderef')]
+
+    def test_moved(self):
+        anchors = reconcile.record(self.xml, self.src)
+        self.write('(* header *)\nlet a = 1\nlet b = 2\nlet c = 3\n')
+        anchors, failures = reconcile.reconcile(self.xml, self.src, anchors)
+        self.assertEqual(['3', '4', '1'], self.lines())
+        self.assertEqual(['other.ml'], [coderef.get('path') for coderef, reason in failures])
+        self.assertEqual(['mdns.ml'], list(anchors))
+
+    def failures(self, failures, path='mdns.ml'):
+        return [(coderef.get('line'), reason) for coderef, reason in failures if coderef.get('path') == path]
+
+    def test_failure_repeated(self):
+        anchors = reconcile.record(self.xml, self.src)
+        self.write('(* header *)\nlet a = 1\nlet c = 3\n')
+        anchors, failures = reconcile.reconcile(self.xml, self.src, anchors)
+        self.assertEqual([('2', 'line was changed or deleted')], self.failures(failures))
+        # The line that still exists is moved, and the file recorded again
+        self.assertEqual(['2', '3', '1'], self.lines())
+        self.assertEqual(reconcile.record(self.xml, self.src)['mdns.ml'], anchors['mdns.ml'])
+        self.write('(* header *)\n\nlet a = 1\nlet c = 3\n')
+        anchors, failures = reconcile.reconcile(self.xml, self.src, anchors)
+        self.assertEqual([('2', 'line was changed or deleted by an earlier update')], self.failures(failures))
+        self.assertEqual(['2', '4', '1'], self.lines())
+        # Once the source file exists, other.ml still has no recorded version
+        self.write('let x = 0\n', 'other.ml')
+        anchors, failures = reconcile.reconcile(self.xml, self.src, anchors)
+        self.assertNotIn('other.ml', anchors)
+        self.assertIn('no recorded version of the source file', [reason for coderef, reason in failures])
+
+    def test_line_not_a_number(self):
+        anchors = reconcile.record(self.xml, self.src)
+        self.xml.find('notes/coderef').set('line', 'two')
+        self.write('(* header *)\nlet a = 1\nlet b = 2\nlet c = 3\n')
+        anchors, failures = reconcile.reconcile(self.xml, self.src, anchors)
+        self.assertEqual([('two', 'line is not a number')], self.failures(failures))
+        self.assertEqual(['two', '4', '1'], self.lines())
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
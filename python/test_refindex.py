@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+import array
+import io
+import json
+import sys
+import unittest
+import refindex
+from testutil import references
+
+
+class TestLocationIndex(unittest.TestCase):
+    def setUp(self):
+        refs = references([
+            ('s6_p1', 'src/mdns.ml', 40),
+            ('s3_p4_c1', 'src/mdns.ml', 12),
+            ('s5_p2', 'src/mdns.ml', 12),
+            ('s6', 'lib_test/test.ml', 7),
+            ])
+        self.index = refindex.LocationIndex.from_references(refs)
+
+    def test_lookup(self):
+        found = self.index.lookup('src/mdns.ml', 12)
+        self.assertEqual(['s3_p4_c1', 's5_p2'], sorted(loc.reqid for loc in found))
+        self.assertEqual([], self.index.lookup('src/mdns.ml', 13))
+        self.assertEqual([12, 12, 40], [loc.line for loc in self.index.lookup('src/mdns.ml', 1, 100)])
+        self.assertEqual('test', self.index.lookup('test.ml', 7)[0].type)
+
+    def test_ambiguous_suffix(self):
+        refs = references([('s6_p1', 'lib/foo.ml', 3), ('s6_p2', 'lib_test/foo.ml', 3)])
+        index = refindex.LocationIndex.from_references(refs)
+        self.assertEqual(['s6_p1'], [loc.reqid for loc in index.lookup('src/lib/foo.ml', 3)])
+        self.assertEqual(['s6_p2'], [loc.reqid for loc in index.lookup('lib_test/foo.ml', 3)])
+        self.assertEqual([], index.lookup('bar.ml', 3))
+        with self.assertRaises(ValueError):
+            index.lookup('foo.ml', 3)
+
+    def test_binary(self):
+        f = io.BytesIO()
+        self.index.save_binary(f)
+        f.seek(0)
+        loaded = refindex.LocationIndex.load_binary(f)
+        self.assertEqual(self.index.as_json(), loaded.as_json())
+
+    def test_binary_other_byte_order(self):
+        f = io.BytesIO()
+        self.index.save_binary(f)
+        f.seek(0)
+        magic = f.readline()
+        header = json.loads(f.readline().decode('utf-8'))
+        # Rewrite the file as a machine of the other byte order would have
+        header['byteorder'] = 'big' if sys.byteorder == 'little' else 'little'
+        columns = array.array('q', f.read())
+        columns.byteswap()
+        f = io.BytesIO(magic + json.dumps(header).encode('utf-8') + b'\n' + columns.tobytes())
+        loaded = refindex.LocationIndex.load_binary(f)
+        self.assertEqual(self.index.as_json(), loaded.as_json())
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+
+import io
+import os
+import os.path
+import random
+import subprocess
+import sys
+import tempfile
+import unittest
+import unittest.mock
+import xml.etree.ElementTree as etree
+import convert_refs
+import parseietf
+import rfc_notes
+import synthrfc
+from rfc_notes import ParseException, References
+from testutil import references
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SPEC = os.path.join(HERE, '..', 'src_test', 'example_spec.xml')
+BASE = 'https://example.com/'
+
+
+def annotated_spec():
+    """Return the example spec with notes on s2_p1_c1 that refer to a clause in s1."""
+    root = etree.parse(SPEC).getroot()
+    clause = [elem for elem in root.iter('clause') if elem.get('id') == 's2_p1_c1'][0]
+    notes = etree.SubElement(clause, 'notes')
+    etree.SubElement(notes, 'note', type='todo').text = 'Check the TTL'
+    etree.SubElement(notes, 'ref', target='s1_p1_c1')
+    return root
+
+
+class ReadOnlyCache(rfc_notes.SectionCache):
+    def put(self, key, fragment):
+        raise AssertionError('section rendered again')
+
+
+class TestSectionCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = annotated_spec()
+        self.refs = references([('s1_p1_c2', 'impl', 'src/mdns.ml', 12), ('s2_p2_c1', 'test', 'lib_test/test.ml', 3)])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def render(self, *options):
+        """Run rfc_notes.py and return the HTML it writes."""
+        notes_path = os.path.join(self.tmp.name, 'rfc6762_notes.xml')
+        etree.ElementTree(self.root).write(notes_path)
+        refs_path = os.path.join(self.tmp.name, 'code.reql')
+        with open(refs_path, 'w') as f:
+            self.refs.save_lines(f)
+        html_path = os.path.join(self.tmp.name, 'out.html')
+        subprocess.check_call([sys.executable, os.path.join(HERE, 'rfc_notes.py'), notes_path,
+            '--html', html_path, '--ref', refs_path, '--base', BASE] + list(options))
+        with open(html_path, 'rb') as f:
+            return f.read()
+
+    def test_cached_output_identical(self):
+        cache_dir = os.path.join(self.tmp.name, 'cache')
+        expected = self.render()
+        self.assertEqual(expected, self.render('--cache', cache_dir))
+        self.assertEqual(len(self.root.find('sections').findall('section')), len(os.listdir(cache_dir)))
+        # Every section comes from the cache the second time
+        self.assertEqual(expected, rfc_notes.root_as_html(self.root, self.refs, BASE, ReadOnlyCache(cache_dir)))
+        self.assertEqual(expected, self.render('--cache', cache_dir))
+
+    def test_changed_section_rendered(self):
+        cache_dir = os.path.join(self.tmp.name, 'cache')
+        rfc_notes.root_as_html(self.root, self.refs, BASE, rfc_notes.SectionCache(cache_dir))
+        self.refs = references([('s1_p1_c2', 'impl', 'src/mdns.ml', 13)])
+        html = rfc_notes.root_as_html(self.root, self.refs, BASE, rfc_notes.SectionCache(cache_dir))
+        self.assertEqual(rfc_notes.root_as_html(self.root, self.refs, BASE), html)
+        self.assertIn(b'src/mdns.ml:13', html)
+
+
+class TestSourceSnippets(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.write('mdns.ml', ''.join('let x{0} = {0}\n'.format(i) for i in range(1, 11)))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text, mtime=1000):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        os.utime(path, (mtime, mtime))
+
+    def test_context(self):
+        snippets = rfc_notes.SourceSnippets(self.tmp.name, 1).snippets('mdns.ml', [1, 5, 10])
+        self.assertEqual('    4: let x4 = 4\n    5> let x5 = 5\n    6: let x6 = 6', snippets[5])
+        self.assertEqual(2, len(snippets[1].splitlines()))
+        self.assertEqual(2, len(snippets[10].splitlines()))
+        self.assertEqual({}, rfc_notes.SourceSnippets(self.tmp.name, 1).snippets('missing.ml', [1]))
+
+    def test_cache(self):
+        snippets = rfc_notes.SourceSnippets(self.tmp.name, 0, max_files=1)
+        self.assertEqual('    2> let x2 = 2', snippets.snippets('mdns.ml', [2])[2])
+        # The line index is kept until the file changes or is evicted
+        self.assertIn(os.path.join(self.tmp.name, 'mdns.ml'), snippets.indexes)
+        self.write('mdns.ml', 'let y = 0\nlet z = 1\n', 2000)
+        self.assertEqual('    2> let z = 1', snippets.snippets('mdns.ml', [2])[2])
+        self.write('other.ml', 'let a = 1\n')
+        snippets.snippets('other.ml', [1])
+        self.assertEqual([os.path.join(self.tmp.name, 'other.ml')], list(snippets.indexes))
+
+    def test_invalid_lines(self):
+        root = annotated_spec()
+        notes = root.find(".//clause[@id='s1_p1_c1']")
+        notes = etree.SubElement(notes, 'notes')
+        for line in [None, 'x', '3']:
+            coderef = etree.SubElement(notes, 'coderef', type='impl', path='mdns.ml')
+            if line is not None:
+                coderef.set('line', line)
+        rfc_notes.SourceSnippets(self.tmp.name, 0).embed(root)
+        self.assertEqual([None, None, '    3> let x3 = 3'],
+                [coderef.findtext('snippet') for coderef in notes.findall('coderef')])
+        html = rfc_notes.root_as_html(root, References(), '')
+        self.assertIn(b'impl: mdns.ml</div>', html)
+
+    def test_snippets_option(self):
+        self.write('mdns.ml', 'let a = 1\nlet b = 2\nlet c = 3\n')
+        notes_path = os.path.join(self.tmp.name, 'rfc6762_notes.xml')
+        etree.ElementTree(annotated_spec()).write(notes_path)
+        refs_path = os.path.join(self.tmp.name, 'code.reql')
+        with open(refs_path, 'w') as f:
+            references([('s1_p1_c2', 'impl', 'mdns.ml', 2)]).save_lines(f)
+        html_path = os.path.join(self.tmp.name, 'out.html')
+        subprocess.check_call([sys.executable, os.path.join(HERE, 'rfc_notes.py'), notes_path,
+            '--html', html_path, '--ref', refs_path, '--snippets', '1', '--src', self.tmp.name])
+        with open(html_path, 'rb') as f:
+            html = f.read()
+        self.assertIn(b'<pre class="snippet">    1: let a = 1\n    2&gt; let b = 2\n    3: let c = 3</pre>', html)
+
+
+class TestSplit(unittest.TestCase):
+    def setUp(self):
+        root = annotated_spec()
+        root.find(".//clause[@id='s1_p1_c2']").set('importance', 'must')
+        self.refs = references([('s1_p1_c2', 'impl', 'src/mdns.ml', 12)])
+        self.pages = dict(rfc_notes.split_as_html(root, self.refs, BASE))
+
+    def page(self, name):
+        return etree.fromstring(self.pages[name].split(b'\n', 1)[1])
+
+    def links(self, name):
+        return [a.get('href') for a in self.page(name).iter('{http://www.w3.org/1999/xhtml}a') if a.get('href')]
+
+    def test_pages(self):
+        self.assertEqual(['index.html', 's1.html', 's2.html'], sorted(self.pages))
+        self.assertTrue(all(html.startswith(b'<!DOCTYPE html>\n') for html in self.pages.values()))
+
+    def test_links_to_other_pages(self):
+        # The note in section 2 refers to a clause in section 1
+        self.assertIn('s1.html#s1_p1_c1', self.links('s2.html'))
+        self.assertNotIn('#s1_p1_c1', self.links('s2.html'))
+        # The index of clauses links to the section pages
+        self.assertIn('s1.html#s1_p1_c2', self.links('index.html'))
+
+    def test_nav(self):
+        self.assertEqual(['index.html', 's1.html'], [href for href in self.links('s2.html') if '#' not in href][:2])
+        nav = [href for href in self.links('s1.html') if href.endswith('.html')]
+        self.assertEqual(['index.html', 's2.html', 'index.html', 's2.html'], nav)
+        self.assertEqual(['s1.html', 's2.html'], [href for href in self.links('index.html') if href.endswith('.html')])
+
+
+def reference_tuples(refs):
+    return sorted((ref.type or '-', ref.doc, ref.id, ref.filename, ref.linenum)
+            for references in refs.references.values() for ref in references)
+
+
+class TestReferenceLines(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        doc = parseietf.parse_path('rfc2671.txt')
+        for i, (path, tree) in enumerate(synthrfc.generate_refs(doc, random.Random(0), 2, 20)):
+            tree.write(os.path.join(self.tmp.name, 'file{0}.req'.format(i)))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def load(self, *names):
+        refs = References()
+        for name in names:
+            refs.load(os.path.join(self.tmp.name, name), None)
+        return refs
+
+    def test_round_trip(self):
+        convert_refs.convert(os.path.join(self.tmp.name, 'file0.req'))
+        xml = self.load('file0.req')
+        lines = self.load('file0.reql')
+        self.assertEqual(20, len(reference_tuples(lines)))
+        self.assertEqual(reference_tuples(xml), reference_tuples(lines))
+        # References without a type are kept as such
+        self.assertIn('-', [ref[0] for ref in reference_tuples(lines)])
+
+    def test_newer_form_loaded(self):
+        for name in ['file0.req', 'file1.req']:
+            convert_refs.convert(os.path.join(self.tmp.name, name))
+        def set_mtime(name, mtime):
+            os.utime(os.path.join(self.tmp.name, name), (mtime, mtime))
+        # file0.reql is up to date, file1.req was changed after converting
+        set_mtime('file0.req', 1000)
+        set_mtime('file0.reql', 1000)
+        set_mtime('file1.reql', 1000)
+        set_mtime('file1.req', 2000)
+        self.assertEqual(['file0.reql', 'file1.req'],
+                sorted(os.path.basename(path) for path in rfc_notes.reference_files([self.tmp.name])))
+        refs = References()
+        refs.load_paths([self.tmp.name], None)
+        self.assertEqual(reference_tuples(self.load('file0.req', 'file1.req')), reference_tuples(refs))
+
+    def test_loaded_without_xml(self):
+        # .reql is read line by line; no element tree is built for it
+        doc = parseietf.parse_path('rfc2671.txt')
+        for i, (path, tree) in enumerate(synthrfc.generate_refs(doc, random.Random(1), 50, 20)):
+            tree.write(os.path.join(self.tmp.name, 'many{0}.req'.format(i)))
+        names = ['many{0}.req'.format(i) for i in range(50)]
+        for name in names:
+            convert_refs.convert(os.path.join(self.tmp.name, name))
+        xml = self.load(*names)
+        with unittest.mock.patch('xml.etree.ElementTree.parse') as parse, \
+                unittest.mock.patch('xml.etree.ElementTree.iterparse') as iterparse:
+            lines = self.load(*[name + 'l' for name in names])
+        parse.assert_not_called()
+        iterparse.assert_not_called()
+        self.assertEqual(1000, len(reference_tuples(lines)))
+        self.assertEqual(reference_tuples(xml), reference_tuples(lines))
+
+    def test_separators_rejected(self):
+        for reqid, filename in [('s1_p1_c1', 'src/a\tb.ml'), ('s1_p1_c1', 'src/a\nb.ml'), ('s1\t', 'src/a.ml')]:
+            refs = references([(reqid, 'impl', filename, 1)])
+            with self.assertRaises(ParseException):
+                refs.save_lines(io.StringIO())
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+import os
+import os.path
+import shutil
+import tempfile
+import unittest
+import unittest.mock
+import rfc_server
+
+
+SPEC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src_test', 'example_spec.xml')
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_eviction(self):
+        cache = rfc_server.LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(1, cache.get('a'))
+        cache.put('c', 3)
+        # 'b' was the least recently used
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(1, cache.get('a'))
+        self.assertEqual(3, cache.get('c'))
+
+
+class TestFileCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'file.txt')
+        self.write(b'first', 1000)
+        self.loads = []
+        self.cache = rfc_server.FileCache(self.load, 4)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def load(self, path, data):
+        self.loads.append(data)
+        return data.decode()
+
+    def write(self, data, mtime):
+        with open(self.path, 'wb') as f:
+            f.write(data)
+        os.utime(self.path, (mtime, mtime))
+
+    def test_unchanged_stamp(self):
+        sha1, value = self.cache.get(self.path)
+        self.assertEqual((sha1, value), self.cache.get(self.path))
+        self.assertEqual([b'first'], self.loads)
+
+    def test_unchanged_contents(self):
+        sha1, value = self.cache.get(self.path)
+        self.write(b'first', 2000)
+        self.assertEqual((sha1, 'first'), self.cache.get(self.path))
+        self.assertEqual([b'first'], self.loads)
+
+    def test_changed_contents(self):
+        sha1, value = self.cache.get(self.path)
+        self.write(b'second', 2000)
+        new_sha1, value = self.cache.get(self.path)
+        self.assertNotEqual(sha1, new_sha1)
+        self.assertEqual('second', value)
+        self.assertEqual([b'first', b'second'], self.loads)
+
+
+class TestRenderService(unittest.TestCase):
+    def setUp(self):
+        self.service = rfc_server.RenderService([SPEC], [], 'https://example.com/')
+
+    def get(self, path):
+        response = []
+        body = self.service({'PATH_INFO': path}, lambda status, headers: response.append(status))
+        return response[0], b''.join(body)
+
+    def test_pages(self):
+        status, body = self.get('/')
+        self.assertEqual('200 OK', status)
+        self.assertIn(b'href="rfc6762.html"', body)
+        status, body = self.get('/rfc6762.html')
+        self.assertEqual('200 OK', status)
+        self.assertIn(b'id="s1"', body)
+        status, body = self.get('/rfc6762/')
+        self.assertEqual('200 OK', status)
+        self.assertIn(b'href="s1.html"', body)
+
+    def test_section(self):
+        status, body = self.get('/rfc6762/s2.html')
+        self.assertEqual('200 OK', status)
+        self.assertIn(b'id="s2"', body)
+        self.assertNotIn(b'id="s1"', body)
+
+    def test_page_cached(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'rfc6762_notes.xml')
+            shutil.copy(SPEC, path)
+            os.utime(path, (1000, 1000))
+            service = rfc_server.RenderService([path], [], 'https://example.com/')
+            with unittest.mock.patch('rfc_server.root_as_html', wraps=rfc_server.root_as_html) as render:
+                page = service.render_page('6762')
+                self.assertIs(page, service.render_page('6762'))
+                self.assertEqual(1, render.call_count)
+                # Touching the file without changing it doesn't render it again
+                os.utime(path, (2000, 2000))
+                self.assertIs(page, service.render_page('6762'))
+                self.assertEqual(1, render.call_count)
+                with open(path, 'rb') as f:
+                    data = f.read()
+                with open(path, 'wb') as f:
+                    f.write(data.replace(b'is helpful', b'is useful'))
+                self.assertIn(b'is useful', service.render_page('6762'))
+                self.assertEqual(2, render.call_count)
+
+    def test_not_found(self):
+        self.assertEqual('404 Not Found', self.get('/rfc1.html')[0])
+        self.assertEqual('404 Not Found', self.get('/rfc6762/s99.html')[0])
+        self.assertEqual('404 Not Found', self.get('/other')[0])
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
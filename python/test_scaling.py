@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+import os
+import random
+import time
+import unittest
+import parseietf
+import rfc_notes
+import synthrfc
+
+
+SCALES = [1, 10, 100]
+# Allowed factor above linear growth, to absorb timing noise.
+# Quadratic behaviour would exceed it by an order of magnitude.
+SLACK = 4
+# Wall-clock checks depend on the machine's load, so they only run on request
+timing = unittest.skipUnless(os.environ.get('REQTRACE_TIMING'), 'set REQTRACE_TIMING=1 to run timing tests')
+
+
+def best_time(f, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        f()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+class TestScaling(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.texts = {scale: synthrfc.Generator(scale).generate() for scale in SCALES}
+
+    def assertLinear(self, f):
+        times = {}
+        for scale in SCALES:
+            # Small inputs are timed repeatedly so the fastest run is not noise
+            times[scale] = best_time(lambda: f(scale), max(1, 100 // scale))
+        for small, large in [(SCALES[0], SCALES[-1]), (SCALES[1], SCALES[-1])]:
+            ratio = times[large] / times[small]
+            self.assertLess(ratio, SLACK * large / small,
+                    'time grew {0:.0f}x from {1}x to {2}x input'.format(ratio, small, large))
+
+    def test_generated_document(self):
+        doc = parseietf.parse(self.texts[10], None)
+        self.assertEqual(9999, doc.rfc_number)
+        self.assertEqual('Synthetic Protocol Specification', doc.title)
+        self.assertEqual('1', doc.sections[2].num)
+        self.assertEqual('AppB', doc.sections[-1].num)
+        self.assertGreater(doc.lines[-1].page, 100)
+        for line in doc.lines:
+            if line.text.startswith('RFC 9999') or line.text.endswith(']'):
+                self.assertEqual(72, len(line.text))
+
+    @timing
+    def test_split_lines(self):
+        def split(scale):
+            text = self.texts[scale]
+            list(parseietf.split_lines(parseietf.Document(text), text))
+        self.assertLinear(split)
+
+    @timing
+    def test_parse(self):
+        self.assertLinear(lambda scale: parseietf.parse(self.texts[scale], None))
+
+    @timing
+    def test_index_clauses(self):
+        roots = {}
+        for scale in SCALES:
+            doc = parseietf.parse(self.texts[scale], None)
+            roots[scale] = synthrfc.generate_notes(doc, random.Random(0)).getroot()
+        self.assertLinear(lambda scale: rfc_notes.index_clauses(roots[scale]))
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+import os.path
+import shutil
+import tempfile
+import unittest
+import unittest.mock
+import xml.etree.ElementTree as etree
+import parseietf
+import tracestore
+from rfc_notes import Reference, References
+
+
+class TestTraceStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        shutil.copy('rfc2671.txt', self.dir)
+        shutil.copy('rfc6762.txt', self.dir)
+        root = parseietf.parse_path('rfc2671.txt').as_xml().getroot()
+        clause = [elem for elem in root.iter('clause') if elem.get('id') == 's1.1_p1_c1'][0]
+        notes = etree.SubElement(clause, 'notes')
+        etree.SubElement(notes, 'coderef', type='impl', path='src/edns.ml', line='10')
+        etree.ElementTree(root).write(os.path.join(self.dir, 'rfc2671_notes.xml'))
+        self.write_refs([('s1.1_p1_c2', 'test', 'lib_test/test_edns.ml', 5),
+            ('s5_p2_c1', 'impl', 'src/mdns.ml', 7)])
+        self.store = tracestore.TraceStore(':memory:')
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def write_refs(self, refs):
+        references = References()
+        for reqid, type, filename, linenum in refs:
+            number = '6762' if filename.endswith('mdns.ml') else '2671'
+            references.references.setdefault(reqid, []).append(Reference(type, ('rfc', number), reqid, filename, linenum))
+        with open(os.path.join(self.dir, 'code.reql'), 'w') as f:
+            references.save_lines(f)
+
+    def sources(self, kind=None):
+        rows = self.store.db.execute('SELECT path, kind FROM sources').fetchall()
+        return sorted(os.path.basename(path) for path, source_kind in rows if kind in (None, source_kind))
+
+    def test_import(self):
+        imported = self.store.import_path(self.dir)
+        self.assertEqual(['code.reql', 'rfc2671.txt', 'rfc2671_notes.xml', 'rfc6762.txt'], sorted(os.path.basename(path) for path in imported))
+        # rfc2671.txt was replaced by the annotated document
+        self.assertEqual(['rfc2671.txt'], self.sources('shadowed'))
+        self.assertEqual([('rfc:2671', 'notes'), ('rfc:6762', 'rfc')],
+                self.store.db.execute('SELECT docid, kind FROM documents ORDER BY docid').fetchall())
+        with unittest.mock.patch('parseietf.parse_path') as parse_path:
+            self.assertEqual([], self.store.import_path(self.dir))
+        parse_path.assert_not_called()
+
+    def test_shadowed(self):
+        self.store.import_path(os.path.join(self.dir, 'rfc2671_notes.xml'))
+        self.assertEqual([], self.store.import_path(os.path.join(self.dir, 'rfc2671.txt')))
+        self.assertEqual(['rfc2671.txt'], self.sources('shadowed'))
+        self.assertEqual([('rfc:2671', 'notes')], self.store.db.execute('SELECT docid, kind FROM documents').fetchall())
+        # Unchanged, the shadowed RFC isn't parsed again
+        with unittest.mock.patch('parseietf.parse_path') as parse_path:
+            self.assertEqual([], self.store.import_path(os.path.join(self.dir, 'rfc2671.txt')))
+        parse_path.assert_not_called()
+
+    def test_reimport(self):
+        self.store.import_path(self.dir)
+        self.write_refs([('s1.1_p1_c2', 'test', 'lib_test/test_edns.ml', 6)])
+        self.assertEqual([os.path.join(self.dir, 'code.reql')], self.store.import_path(self.dir))
+        self.assertEqual([('rfc:2671', 's1.1_p1_c2', 'test', 6)], self.store.refs_from('lib_test/test_edns.ml'))
+        self.assertEqual([], self.store.refs_from('src/mdns.ml'))
+        self.assertEqual(2, self.store.db.execute('SELECT COUNT(*) FROM refs').fetchone()[0])
+
+    def test_queries(self):
+        self.store.import_path(self.dir)
+        self.assertEqual([('impl', 'src/edns.ml', 10)], self.store.refs_to(2671, 's1.1_p1_c1'))
+        self.assertEqual([('rfc:6762', 's5_p2_c1', 'impl', 7)], self.store.refs_from('src/mdns.ml'))
+        missing = [reqid for docid, reqid, importance, text in self.store.missing('test', number=2671)]
+        self.assertNotIn('s1.1_p1_c2', missing)
+        self.assertIn('s1.1_p1_c1', missing)
+        self.assertEqual(73, len(missing))
+        missing = self.store.missing('impl', importance='must', number=6762)
+        self.assertTrue(missing)
+        self.assertTrue(all(importance == 'must' for docid, reqid, importance, text in missing))
+        self.assertNotIn('s5_p2_c1', [reqid for docid, reqid, importance, text in missing])
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
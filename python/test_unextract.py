@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+import contextlib
+import io
+import os
+import os.path
+import re
+import tempfile
+import unittest
+import unextract
+from rfc_notes import ParseException
+
+
+NOTES = '''<rfc number="6762">
+<sections>
+<section num="1" id="s1" name="Introduction">
+<notes><coderef type="impl" path="src/mdns.ml" line="1"/></notes>
+<paragraph num="1" id="s1_p1">
+<clause id="s1_p1_c1" num="1">
+<notes><coderef type="impl" path="src/mdns.ml" line="3"/><coderef type="test" path="lib_test/test.ml" line="2"/></notes>
+</clause>
+</paragraph>
+</section>
+</sections>
+</rfc>
+'''
+
+
+class TestReadCoderefs(unittest.TestCase):
+    def test_targets(self):
+        rfc_num, files = unextract.read_coderefs(io.StringIO(NOTES))
+        self.assertEqual('6762', rfc_num)
+        self.assertEqual(['src/mdns.ml', 'lib_test/test.ml'], list(files))
+        self.assertEqual('Impl', files['src/mdns.ml'].reftype)
+        self.assertEqual([(1, 's1'), (3, 's1_p1_c1')], [(ref.linenum, ref.id) for ref in files['src/mdns.ml'].refs])
+        self.assertEqual([(2, 's1_p1_c1')], [(ref.linenum, ref.id) for ref in files['lib_test/test.ml'].refs])
+
+    def test_not_rfc(self):
+        with self.assertRaises(ParseException):
+            unextract.read_coderefs(io.StringIO('<unit/>'))
+
+    def test_coderef_outside_notes(self):
+        with self.assertRaises(ParseException):
+            unextract.read_coderefs(io.StringIO(NOTES.replace('<notes><coderef type="impl" path="src/mdns.ml" line="1"/></notes>',
+                '<coderef type="impl" path="src/mdns.ml" line="1"/>')))
+
+    def test_notes_outside_clause(self):
+        with self.assertRaises(ParseException):
+            unextract.read_coderefs(io.StringIO(NOTES.replace('<sections>',
+                '<header><notes><coderef type="impl" path="src/mdns.ml" line="1"/></notes></header>\n<sections>')))
+
+
+SOURCES = {
+        'src/mdns.ml': '(* mDNS *)\nlet a = 1\nlet b = 2\nlet c = 3\n',
+        'lib_test/test.ml': 'let t1 () = ()\nlet t2 () = ()\n',
+        }
+
+
+class TestInsertAttributes(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.notes = os.path.join(self.tmp.name, 'rfc6762_notes.xml')
+        with open(self.notes, 'w') as f:
+            f.write(NOTES)
+        self.target = self.make_target('src')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_target(self, name):
+        target = os.path.join(self.tmp.name, name)
+        for path, text in SOURCES.items():
+            os.makedirs(os.path.dirname(os.path.join(target, path)), exist_ok=True)
+            with open(os.path.join(target, path), 'w') as f:
+                f.write(text)
+        return target
+
+    def run_unextract(self, target, **options):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            unextract.insert_attributes(self.notes, target, None, False, **options)
+        return out.getvalue()
+
+    def shift_lines(self, delta):
+        """Move the coderefs in the notes by delta lines, as if reconciled with the rewritten files."""
+        with open(self.notes, 'w') as f:
+            f.write(re.sub(r'line="(\d+)"', lambda match: 'line="{0}"'.format(int(match.group(1)) + delta), NOTES))
+
+    def read(self, target, path):
+        with open(os.path.join(target, path)) as f:
+            return f.read()
+
+    def test_insert(self):
+        self.assertEqual('src/mdns.ml\nlib_test/test.ml\n', self.run_unextract(self.target))
+        lines = self.read(self.target, 'src/mdns.ml').splitlines()
+        self.assertEqual('[@@@reftype Impl]', lines[1])
+        self.assertTrue(lines[-2].endswith('let b = 2 [@ref rfc "s1_p1_c1"]'))
+
+    def test_unchanged_files_not_written(self):
+        self.run_unextract(self.target)
+        # The header and a blank line were inserted at the start of each file
+        self.shift_lines(3)
+        paths = [os.path.join(self.target, path) for path in SOURCES]
+        for path in paths:
+            os.utime(path, (1000, 1000))
+        # Only rewritten files are listed
+        self.assertEqual('', self.run_unextract(self.target))
+        self.assertEqual([1000, 1000], [os.stat(path).st_mtime for path in paths])
+
+    def test_dry_run(self):
+        diff = self.run_unextract(self.target, dry_run=True)
+        self.assertIn('--- a/src/mdns.ml\n+++ b/src/mdns.ml\n', diff)
+        self.assertIn('+let b = 2 [@ref rfc "s1_p1_c1"]\n', diff)
+        for path, text in SOURCES.items():
+            self.assertEqual(text, self.read(self.target, path))
+        self.run_unextract(self.target)
+        self.shift_lines(3)
+        self.assertEqual('', self.run_unextract(self.target, dry_run=True))
+
+    def test_jobs(self):
+        serial = self.run_unextract(self.target, jobs=1)
+        parallel_target = self.make_target('parallel')
+        self.assertEqual(serial, self.run_unextract(parallel_target, jobs=4))
+        for path in SOURCES:
+            self.assertEqual(self.read(self.target, path), self.read(parallel_target, path))
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
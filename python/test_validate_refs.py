@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import os.path
+import tempfile
+import unittest
+import validate_refs
+from testutil import references
+
+
+NOTES = '''<rfc number="9999">
+<sections>
+<section name="Table of Contents">
+<paragraph num="1" id="toc_p1"><clause id="toc_p1_c1" num="1"/></paragraph>
+</section>
+<section num="1" id="s1" name="Introduction">
+<paragraph num="1" id="s1_p1"><clause id="s1_p1_c1" num="1"/><clause id="s1_p1_c2" num="2"/></paragraph>
+<paragraph num="2" id="s1_p1"/>
+</section>
+<section num="2" id="s2" name="Requirements">
+<notes><note>Annotated</note></notes>
+<paragraph num="1" id="s2_p1"><clause id="s2_p1_c1" num="1"/></paragraph>
+</section>
+</sections>
+</rfc>
+'''
+
+
+class TestValidate(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.write('rfc9999_notes.xml', NOTES)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        with open(os.path.join(self.tmp.name, name), 'w') as f:
+            f.write(text)
+
+    def problems(self, locations, jobs=1):
+        problems = validate_refs.validate([self.tmp.name], references(locations, ('rfc', '9999')), jobs)
+        return [(problem.kind, problem.ref.id) for problem in problems]
+
+    def test_clean(self):
+        self.assertEqual([], self.problems([('s1_p1_c2', 'a.ml', 1), ('s2', 'a.ml', 2), ('s2_p1_c1', 'b.ml', 1)]))
+
+    def test_dangling(self):
+        self.assertEqual([('dangling', 's1_p1_c3')], self.problems([('s1_p1_c3', 'a.ml', 1)]))
+
+    def test_ambiguous(self):
+        self.assertEqual([('ambiguous', 's1_p1')], self.problems([('s1_p1', 'a.ml', 1)]))
+
+    def test_duplicate(self):
+        self.assertEqual([('duplicate', 's2_p1_c1')], self.problems([('s2_p1_c1', 'a.ml', 1), ('s2_p1_c1', 'a.ml', 1)]))
+
+    def test_hidden(self):
+        self.assertEqual([('hidden', 's1'), ('hidden', 'toc_p1_c1')],
+                self.problems([('s1', 'a.ml', 1), ('toc_p1_c1', 'a.ml', 2)]))
+
+    def test_same_document_twice(self):
+        # The output of parseietf.py alongside the annotated document
+        self.write('rfc9999.xml', NOTES.replace('<notes><note>Annotated</note></notes>', ''))
+        self.assertEqual([('dangling', 's1_p1_c3')], self.problems([('s1_p1_c3', 'a.ml', 1), ('s2', 'a.ml', 2)], jobs=2))
+
+    def test_missing_document(self):
+        refs = references([('s1', 'a.ml', 1)], ('rfc', '9999'))
+        problems = validate_refs.validate([], refs)
+        self.assertEqual(['no annotated document for rfc:9999'], [problem.message for problem in problems])
+
+
+def main():
+    unittest.main()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,16 @@
+# Helpers shared by the test_*.py scripts.
+
+from rfc_notes import Reference, References
+
+
+def references(locations, docid=('rfc', '6762')):
+    """Return References to docid from (reqid, filename, linenum) or (reqid, type, filename, linenum) tuples."""
+    refs = References()
+    for location in locations:
+        if len(location) == 3:
+            reqid, filename, linenum = location
+            type = None
+        else:
+            reqid, type, filename, linenum = location
+        refs.references.setdefault(reqid, []).append(Reference(type, docid, reqid, filename, linenum))
+    return refs
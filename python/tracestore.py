@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+
+# A local SQLite database of specification documents, their clauses and
+# notes, and the code references extracted from OCaml source (.req files),
+# so that questions spanning several documents can be answered without
+# parsing every file again.
+
+import hashlib
+import os
+import os.path
+import sqlite3
+import xml.etree.ElementTree as etree
+
+import parseietf
+from rfc_notes import Reference, References
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    sha1 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    docid TEXT PRIMARY KEY,
+    number TEXT,
+    title TEXT,
+    sha1 TEXT,
+    kind TEXT NOT NULL,
+    source TEXT NOT NULL,
+    xml BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS elements (
+    docid TEXT NOT NULL,
+    reqid TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    section TEXT,
+    importance TEXT,
+    text TEXT,
+    has_notes INTEGER NOT NULL,
+    source TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS elements_docid_reqid ON elements (docid, reqid);
+CREATE INDEX IF NOT EXISTS elements_source ON elements (source);
+CREATE TABLE IF NOT EXISTS refs (
+    docid TEXT NOT NULL,
+    reqid TEXT NOT NULL,
+    type TEXT NOT NULL,
+    path TEXT NOT NULL,
+    line INTEGER,
+    origin TEXT NOT NULL,
+    source TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS refs_docid_reqid ON refs (docid, reqid);
+CREATE INDEX IF NOT EXISTS refs_path ON refs (path, line);
+CREATE INDEX IF NOT EXISTS refs_source ON refs (source);
+'''
+
+KINDS = { '.txt': 'rfc', '.xml': 'notes', '.req': 'refs', '.reql': 'refs' }
+
+
+def path_kind(path):
+    if parseietf.is_text_path(path):
+        return 'rfc'
+    return KINDS.get(os.path.splitext(path)[1])
+
+
+def docid_key(docid):
+    """Convert a docid tuple such as ('rfc', '6762') to a string key."""
+    return '{0}:{1}'.format(*docid)
+
+
+def rfc_key(number):
+    return docid_key(('rfc', str(number)))
+
+
+def file_sha1(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class TraceStore:
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def import_path(self, path):
+        """Import a file, or every known file type below a directory.
+
+        Files that are unchanged since they were last imported are skipped.
+        An RFC whose annotated document has been imported is recorded as a
+        'shadowed' source, so it is only parsed again if it changes.
+        Returns the list of paths whose contents were (re)imported.
+        """
+        if os.path.isdir(path):
+            imported = []
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if path_kind(filename):
+                        imported.extend(self.import_path(os.path.join(dirpath, filename)))
+            return imported
+        kind = path_kind(path)
+        if kind is None:
+            return []
+        sha1 = file_sha1(path)
+        source = os.path.abspath(path)
+        row = self.db.execute('SELECT sha1 FROM sources WHERE path = ?', (source,)).fetchone()
+        if row and row[0] == sha1:
+            return []
+        with self.db:
+            self.forget(source)
+            if kind == 'rfc':
+                doc = parseietf.parse_path(path)
+                if not self.insert_document(doc.as_xml().getroot(), kind, source):
+                    self.db.execute('INSERT INTO sources (path, kind, sha1) VALUES (?, ?, ?)', (source, 'shadowed', sha1))
+                    return []
+            elif kind == 'notes':
+                self.insert_document(etree.parse(path).getroot(), kind, source)
+            else:
+                refs = References()
+                refs.load(path, None)
+                self.insert_refs(refs, source)
+            self.db.execute('INSERT INTO sources (path, kind, sha1) VALUES (?, ?, ?)', (source, kind, sha1))
+        return [path]
+
+    def forget(self, source):
+        for table in ['sources', 'documents', 'elements', 'refs']:
+            column = 'path' if table == 'sources' else 'source'
+            self.db.execute('DELETE FROM {0} WHERE {1} = ?'.format(table, column), (source,))
+
+    def insert_document(self, root, kind, source):
+        """Insert an RFC or annotated RFC, replacing any other version of it.
+
+        Returns False if nothing was inserted, because the root is not an
+        <rfc> or an RFC's annotated document has already been imported.
+        """
+        if root.tag != 'rfc':
+            return False
+        docid = rfc_key(root.get('number'))
+        row = self.db.execute('SELECT kind, source FROM documents WHERE docid = ?', (docid,)).fetchone()
+        if row and row[0] == 'notes' and kind == 'rfc':
+            # The annotated document takes precedence over the plain text
+            return False
+        if row and row[0] == 'rfc' and kind == 'notes' and row[1] != source:
+            # The plain text is replaced, and is now shadowed
+            self.db.execute("UPDATE sources SET kind = 'shadowed' WHERE path = ?", (row[1],))
+        for table in ['documents', 'elements', 'refs']:
+            if table == 'refs':
+                self.db.execute("DELETE FROM refs WHERE docid = ? AND origin = 'notes'", (docid,))
+            else:
+                self.db.execute('DELETE FROM {0} WHERE docid = ?'.format(table), (docid,))
+        self.db.execute('INSERT INTO documents (docid, number, title, sha1, kind, source, xml) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (docid, root.get('number'), root.get('title'), root.get('sha1'), kind, source, etree.tostring(root)))
+
+        elements = []
+        coderefs = []
+        def add(elem, section_id):
+            id = elem.get('id')
+            if not id:
+                return
+            if elem.tag == 'clause':
+                text = ' '.join(sub.text for sub in elem.findall('linesub'))
+            else:
+                text = None
+            elements.append((docid, id, elem.tag, len(elements), section_id, elem.get('importance'),
+                text, int(elem.find('notes') is not None), source))
+            for notes in elem.findall('notes'):
+                for coderef in notes.findall('coderef'):
+                    line = coderef.get('line')
+                    coderefs.append((docid, id, coderef.get('type', 'code'), coderef.get('path', ''),
+                        int(line) if line else None, 'notes', source))
+
+        sections = root.find('sections')
+        for section in sections.findall('section') if sections is not None else []:
+            section_id = section.get('id')
+            add(section, section_id)
+            for paragraph in section.findall('paragraph'):
+                add(paragraph, section_id)
+                for clause in paragraph.findall('clause'):
+                    add(clause, section_id)
+        self.db.executemany('INSERT INTO elements VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', elements)
+        self.db.executemany('INSERT INTO refs VALUES (?, ?, ?, ?, ?, ?, ?)', coderefs)
+        return True
+
+    def insert_refs(self, refs, source):
+        rows = []
+        for reqid, references in refs.references.items():
+            for ref in references:
+                coderef = ref.as_xml()
+                rows.append((docid_key(ref.doc), reqid, coderef.get('type'), ref.filename, ref.linenum, 'req', source))
+        self.db.executemany('INSERT INTO refs VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def notes_tree(self, number):
+        """Return the root of the notes XML for an RFC, or None."""
+        row = self.db.execute('SELECT xml FROM documents WHERE docid = ?', (rfc_key(number),)).fetchone()
+        if row is None:
+            return None
+        return etree.fromstring(row[0])
+
+    def load_references(self, refs, docid):
+        """Add the references extracted from .req files to an rfc_notes.References."""
+        cursor = self.db.execute("SELECT reqid, type, path, line FROM refs WHERE docid = ? AND origin = 'req' ORDER BY source, rowid",
+                (docid_key(docid),))
+        for reqid, type, path, line in cursor:
+            refs.references.setdefault(reqid, []).append(Reference(type, docid, reqid, path, line))
+
+    def missing(self, reftype, importance=None, number=None):
+        """Return (docid, reqid, importance, text) for clauses without references of reftype."""
+        sql = '''SELECT e.docid, e.reqid, e.importance, e.text FROM elements e
+            WHERE e.kind = 'clause'
+            AND NOT EXISTS (SELECT 1 FROM refs r WHERE r.docid = e.docid AND r.reqid = e.reqid AND r.type = ?)'''
+        params = [reftype]
+        if importance:
+            sql += ' AND e.importance = ?'
+            params.append(importance)
+        if number:
+            sql += ' AND e.docid = ?'
+            params.append(rfc_key(number))
+        sql += ' ORDER BY e.docid, e.seq'
+        return self.db.execute(sql, params).fetchall()
+
+    def refs_to(self, number, reqid):
+        """Return (type, path, line) for the references to a requirement."""
+        return self.db.execute('SELECT type, path, line FROM refs WHERE docid = ? AND reqid = ? ORDER BY path, line',
+                (rfc_key(number), reqid)).fetchall()
+
+    def refs_from(self, path):
+        """Return (docid, reqid, type, line) for the references in a source file."""
+        return self.db.execute('SELECT docid, reqid, type, line FROM refs WHERE path = ? ORDER BY line',
+                (path,)).fetchall()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Store and query specification documents, notes and code references in SQLite')
+    parser.add_argument('--db', dest='db', default='reqtrace.db', type=str,
+            help='The path to the SQLite database')
+    subparsers = parser.add_subparsers(dest='command')
+    subparser = subparsers.add_parser('import',
+            help='Import RFCs (.txt, .txt.gz, .txt.xz), annotated RFCs (.xml) and references (.req), skipping unchanged files')
+    subparser.add_argument('paths', nargs='+', type=str,
+            help='Files or directories to import')
+    subparser = subparsers.add_parser('missing',
+            help='List clauses without any references of a given type')
+    subparser.add_argument('--type', dest='type', default='test', choices=['impl', 'test'],
+            help='The type of reference that should be present')
+    subparser.add_argument('--importance', dest='importance', choices=['must', 'should', 'may'],
+            help='Only list clauses with this importance')
+    subparser.add_argument('--rfc', dest='rfc', type=int,
+            help='Only list clauses in this RFC')
+    subparser = subparsers.add_parser('refs',
+            help='List the code references to a requirement')
+    subparser.add_argument('rfc', type=int)
+    subparser.add_argument('reqid', type=str)
+    subparser = subparsers.add_parser('file',
+            help='List the requirements referenced from a source file')
+    subparser.add_argument('path', type=str)
+    subparser = subparsers.add_parser('sql',
+            help='Run an arbitrary SQL query')
+    subparser.add_argument('query', type=str)
+    args = parser.parse_args()
+    if args.command is None:
+        parser.error('a command is required')
+
+    store = TraceStore(args.db)
+    if args.command == 'import':
+        for path in args.paths:
+            for imported in store.import_path(path):
+                print(imported)
+    elif args.command == 'missing':
+        for docid, reqid, importance, text in store.missing(args.type, args.importance, args.rfc):
+            print('{0} {1} {2}: {3}'.format(docid, reqid, importance or '-', text))
+    elif args.command == 'refs':
+        for type, path, line in store.refs_to(args.rfc, args.reqid):
+            print('{0}:{1}: {2}'.format(path, line, type))
+    elif args.command == 'file':
+        for docid, reqid, type, line in store.refs_from(args.path):
+            print('{0}:{1}: {2} {3} {4}'.format(args.path, line, type, docid, reqid))
+    elif args.command == 'sql':
+        for row in store.db.execute(args.query):
+            print('\t'.join(str(value) for value in row))
+    store.close()
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,13 @@
 #!/usr/bin/env python3
 
+import concurrent.futures
+import difflib
 import os
 import os.path
 import re
+import shutil
+import sys
+import tempfile
 import xml.etree.ElementTree as etree
 
 from rfc_notes import ParseException
@@ -19,25 +24,66 @@ class Reference:
 
 class SourceFile:
     def __init__(self, path, reftype):
+        self.path = path
         self.reftype = reftype
         self.refs = []
 
     def insert_refs(self, lines, docref, offset):
+        # Group the refs by line so that each line is rewritten at most once
+        by_line = {}
         for ref in self.refs:
-            i = ref.linenum - 1 + offset
             attr = ' [@ref {0} "{1}"]'.format(docref, ref.id)
+            by_line.setdefault(ref.linenum - 1 + offset, {})[attr] = None
+        for i, attrs in by_line.items():
             line = lines[i].rstrip('\n')
-            if line.find(attr) == -1:
-                lines[i] = line + attr + '\n'
-
-
-def get_target(elem, parent_map):
-    assert elem.tag == NS + 'coderef'
-    parent = parent_map[elem]
-    assert parent.tag == NS + 'notes'
-    grandparent = parent_map[parent]
-    assert grandparent.tag in (NS + 'clause', NS + 'paragraph', NS + 'section')
-    return grandparent.get('id')
+            missing = [attr for attr in attrs if line.find(attr) == -1]
+            if missing:
+                lines[i] = line + ''.join(missing) + '\n'
+
+
+def get_target(ancestors):
+    """Return the id targeted by a <coderef>, given its ancestor elements."""
+    if len(ancestors) < 2 or ancestors[-1].tag != NS + 'notes':
+        raise ParseException('<coderef> must be inside <notes>')
+    target = ancestors[-2]
+    if target.tag not in (NS + 'clause', NS + 'paragraph', NS + 'section'):
+        raise ParseException('<notes> containing <coderef> must be inside <clause>, <paragraph> or <section>')
+    return target.get('id')
+
+
+def read_coderefs(source):
+    """Collect the code references from a notes XML file in a single pass.
+
+    The document is streamed with iterparse while keeping a stack of
+    ancestor elements, and each section is discarded once it has been
+    read, so memory use does not grow with the size of the document.
+    Returns the RFC number and a dict of SourceFile objects by path.
+    """
+    rfc_num = None
+    files = {}
+    ancestors = []
+    for event, elem in etree.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if not ancestors:
+                if elem.tag != NS + 'rfc':
+                    raise ParseException('Specification XML file should have <rfc> as root')
+                rfc_num = elem.attrib['number']
+            elif elem.tag == NS + 'coderef':
+                path = elem.get('path')
+                reftype = REFTYPES[elem.get('type')]
+                if path not in files:
+                    file = SourceFile(path, reftype)
+                    files[path] = file
+                else:
+                    file = files[path]
+                    assert file.reftype == reftype
+                file.refs.append(Reference(int(elem.get('line')), get_target(ancestors)))
+            ancestors.append(elem)
+        else:
+            ancestors.pop()
+            if elem.tag == NS + 'section' and ancestors:
+                ancestors[-1].remove(elem)
+    return rfc_num, files
 
 
 def add_header(lines, header):
@@ -69,49 +115,69 @@ def add_header(lines, header):
     return offset
 
 
-def insert_attributes(xml, target_dir, let_name, camlp4):
+def write_atomic(path, lines):
+    """Replace the file at path by renaming a temporary file over it."""
+    dir_name, base_name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + base_name + '.', dir=dir_name or '.')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.writelines(lines)
+        shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def update_file(file, target_dir, rfc_num, let_name, camlp4, dry_run):
+    """Insert the attributes for one source file.
+
+    The file is only rewritten if its content changes.
+    Returns a pair of whether the content changed, and a unified diff of
+    the change if dry_run is set, in which case the file isn't written.
+    """
+    path = os.path.join(target_dir, file.path)
+    with open(path, 'r') as f:
+        old_lines = f.readlines()
+    lines = list(old_lines)
+    if camlp4:
+        offset = 0
+        # camlp4 mangles [@ref (rfc 9999) "xxx"] into [@ref rfc 999 "xxx"]
+        #docref = '(rfc {0})'.format(rfc_num)
+        docref = let_name
+    else:
+        header = [
+                '[@@@reftype {0}]\n'.format(file.reftype),
+                '[@@@specdoc let {0} = rfc {1}"]\n'.format(let_name, rfc_num),
+                ]
+        offset = add_header(lines, header)
+        docref = let_name
+    file.insert_refs(lines, docref, offset)
+    if lines == old_lines:
+        return False, None
+    if dry_run:
+        return True, ''.join(difflib.unified_diff(old_lines, lines, 'a/' + file.path, 'b/' + file.path))
+    write_atomic(path, lines)
+    return True, None
+
+
+def insert_attributes(source, target_dir, let_name, camlp4, dry_run=False, jobs=None):
     if not let_name:
         let_name = 'rfc'
-    parent_map = {child:parent for parent in xml.iter() for child in parent}
-    root = xml.getroot()
-    if root.tag != NS + 'rfc':
-        raise ParseException('Specification XML file should have <rfc> as root')
-    rfc_num = root.attrib['number']
+    rfc_num, files = read_coderefs(source)
 
-    files = {}
-    #import pdb; pdb.set_trace()
-    for elem in root.iter():
-        if elem.tag == NS + 'coderef':
-            path = elem.get('path')
-            reftype = REFTYPES[elem.get('type')]
-            if path not in files:
-                file = SourceFile(path, reftype)
-                files[path] = file
-            else:
-                file = files[path]
-                assert file.reftype == reftype
-            file.refs.append(Reference(int(elem.get('line')), get_target(elem, parent_map)))
-
-    for rel_path, file in files.items():
-        print(rel_path)
-        path = os.path.join(target_dir, rel_path)
-        with open(path, 'r') as f:
-            lines = f.readlines()
-        if camlp4:
-            offset = 0
-            # camlp4 mangles [@ref (rfc 9999) "xxx"] into [@ref rfc 999 "xxx"]
-            #docref = '(rfc {0})'.format(rfc_num)
-            docref = let_name
-        else:
-            header = [
-                    '[@@@reftype {0}]\n'.format(file.reftype),
-                    '[@@@specdoc let {0} = rfc {1}"]\n'.format(let_name, rfc_num),
-                    ]
-            offset = add_header(lines, header)
-            docref = let_name
-        file.insert_refs(lines, docref, offset)
-        with open(path, 'w') as f:
-            f.writelines(lines)
+    def update(file):
+        return update_file(file, target_dir, rfc_num, let_name, camlp4, dry_run)
+
+    # Each file is independent, so they are processed in parallel,
+    # but reported in a stable order.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        for file, (changed, diff) in zip(files.values(), executor.map(update, files.values())):
+            if dry_run:
+                if diff:
+                    sys.stdout.write(diff)
+            elif changed:
+                print(file.path)
 
 
 def main():
@@ -125,11 +191,13 @@ def main():
             help='The root directory containing the source code to be modified')
     parser.add_argument('--camlp4', action='store_true',
             help='Set this option to generate camlp4-compatible code')
+    parser.add_argument('--dry-run', dest='dry_run', action='store_true',
+            help='Print a unified diff of the changes instead of modifying the source code')
+    parser.add_argument('--jobs', dest='jobs', type=int,
+            help='The number of source files to process in parallel')
     args = parser.parse_args()
 
-    doc = etree.parse(args.input[0])
-
-    insert_attributes(doc, args.target, args.let, args.camlp4)
+    insert_attributes(args.input[0], args.target, args.let, args.camlp4, args.dry_run, args.jobs)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+# Checks that every reference extracted from the source code (.req files)
+# targets an element that exists in the annotated RFC it refers to.
+#
+# rfc_notes.py only shows references whose id matches an element, so a
+# reference to a clause that doesn't exist, or no longer exists after the
+# document was renumbered, would otherwise disappear without a trace.
+
+import collections
+import concurrent.futures
+import os
+import os.path
+import sys
+import xml.etree.ElementTree as etree
+
+from rfc_notes import References, docid_as_text
+
+
+INDEXED_TAGS = ('section', 'paragraph', 'clause')
+
+
+class DocumentIds:
+    """The ids of the sections, paragraphs and clauses of an annotated RFC."""
+    def __init__(self, path):
+        self.path = path
+        self.number = None
+        self.counts = collections.Counter()
+        # Ids of elements whose references are never shown
+        self.hidden = {}
+        toc = False
+        section_has_notes = {}
+        for event, elem in etree.iterparse(path, events=['start', 'end']):
+            if event == 'start':
+                if elem.tag == 'rfc':
+                    self.number = elem.get('number')
+                elif elem.tag == 'section':
+                    toc = elem.get('name') == 'Table of Contents'
+                continue
+            if elem.tag in INDEXED_TAGS:
+                id = elem.get('id')
+                if id:
+                    self.counts[id] += 1
+                    if elem.tag == 'section':
+                        if elem.find('notes') is None:
+                            section_has_notes.setdefault(id, False)
+                        else:
+                            section_has_notes[id] = True
+                    elif toc:
+                        self.hidden[id] = 'it is in the Table of Contents'
+                if elem.tag == 'section':
+                    elem.clear()
+        for id, has_notes in section_has_notes.items():
+            if not has_notes:
+                self.hidden.setdefault(id, 'references to sections are only shown if the section has notes')
+
+    @property
+    def docid(self):
+        return ('rfc', self.number)
+
+
+class Problem:
+    __slots__ = ['kind', 'ref', 'message']
+
+    def __init__(self, kind, ref, message):
+        self.kind = kind
+        self.ref = ref
+        self.message = message
+
+    def __str__(self):
+        return '{0}:{1}: {2}: {3}'.format(self.ref.filename, self.ref.linenum, self.kind, self.message)
+
+
+def check_document(ids, refs):
+    """Return the Problems with refs, which are the references to the document with these ids."""
+    problems = []
+    docid = docid_as_text(ids.docid)
+    seen = set()
+    for ref in refs:
+        count = ids.counts.get(ref.id, 0)
+        target = '{0} {1}'.format(docid, ref.id)
+        if count == 0:
+            problems.append(Problem('dangling', ref, 'no element with id {0} in {1}'.format(target, ids.path)))
+        elif count > 1:
+            problems.append(Problem('ambiguous', ref, '{0} elements with id {1} in {2}, only the first is annotated'.format(count, target, ids.path)))
+        elif ref.id in ids.hidden:
+            problems.append(Problem('hidden', ref, 'reference to {0} is not shown because {1}'.format(target, ids.hidden[ref.id])))
+        key = (ref.id, ref.filename, ref.linenum)
+        if key in seen:
+            problems.append(Problem('duplicate', ref, 'reference to {0} is repeated'.format(target)))
+        seen.add(key)
+    return problems
+
+
+def notes_paths(paths):
+    """Yield each annotated document in paths, looking for .xml files in directories."""
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if filename.endswith('.xml'):
+                        yield os.path.join(dirpath, filename)
+        else:
+            yield path
+
+
+def prefer(ids, other):
+    """Choose which of two documents with the same docid to check against.
+
+    A document with notes (rfcNNNN_notes.xml) is preferred to the plain
+    output of parseietf.py, and otherwise the first one found is kept.
+    """
+    if other is None:
+        return ids
+    if ids.path.endswith('_notes.xml') and not other.path.endswith('_notes.xml'):
+        return ids
+    return other
+
+
+def validate(paths, refs, jobs=None):
+    """Check every reference in refs against the annotated RFCs in paths.
+
+    The documents are parsed in a pool of jobs processes, or in this
+    process if jobs is 1. Where several documents have the same docid,
+    only one of them is checked (see prefer). Returns a list of
+    Problems, sorted by source location.
+    """
+    by_doc = collections.defaultdict(list)
+    for references in refs.references.values():
+        for ref in references:
+            by_doc[ref.doc].append(ref)
+
+    paths = list(notes_paths(paths))
+    if jobs == 1 or len(paths) < 2:
+        all_ids = [DocumentIds(path) for path in paths]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            all_ids = list(executor.map(DocumentIds, paths))
+    documents = {}
+    for ids in all_ids:
+        documents[ids.docid] = prefer(ids, documents.get(ids.docid))
+
+    problems = []
+    for docid, ids in documents.items():
+        problems.extend(check_document(ids, by_doc.get(docid, [])))
+    for docid, doc_refs in by_doc.items():
+        if docid not in documents:
+            for ref in doc_refs:
+                problems.append(Problem('dangling', ref, 'no annotated document for {0}'.format(docid_as_text(docid))))
+    problems.sort(key=lambda problem: (problem.ref.filename, problem.ref.linenum, problem.kind))
+    return problems
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Check that requirement references extracted from OCaml code refer to existing clauses')
+    parser.add_argument('input', metavar='rfcNNNN_notes.xml', nargs='+', type=str,
+            help='The paths to the annotated XML documents (.xml), or directories containing them')
+    parser.add_argument('--ref', dest='ref', nargs='+', required=True, type=str,
+            help='The path to one or more input XML files containing requirement references extracted from OCaml code, directories or tar archives of them')
+    parser.add_argument('--jobs', dest='jobs', type=int,
+            help='The number of processes parsing documents in parallel, by default one per CPU')
+    parser.add_argument('--allow-hidden', dest='allow_hidden', action='store_true',
+            help='Don\'t fail because of references that exist but are not shown in the HTML')
+    args = parser.parse_args()
+
+    refs = References()
+    refs.load_paths(args.ref, None)
+    problems = validate(args.input, refs, args.jobs)
+    for problem in problems:
+        sys.stderr.write(str(problem) + '\n')
+    if any(problem.kind != 'hidden' or not args.allow_hidden for problem in problems):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
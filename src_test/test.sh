@@ -7,7 +7,7 @@ outdir=_build/src_test
 [ ! -d ${outdir} ] && mkdir ${outdir}
 
 if which python3 > /dev/null ; then
-    (cd ./python && ./test_parseietf.py)
+    (cd ./python && ./test_parseietf.py && ./test_reconcile.py && ./test_align.py && ./test_refindex.py && ./test_impact.py && ./test_notespatch.py && ./test_validate_refs.py && ./test_rfc_server.py && ./test_corpus_stats.py && ./test_tracestore.py && ./test_rfc_notes.py && ./test_unextract.py)
 else
     echo "Warning: python3 is not installed"
 fi